@@ -0,0 +1,174 @@
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from candle_archive import CandleArchive
+from candle_store import fetch_history
+from detectors import bearish, bullish, detect
+from trading_strategy import PAIRS, calculate_indicators
+
+DEFAULT_PARAMS = {"sl_mult": 1.5, "tp_mult": 3.0, "rsi_overbought": 70, "rsi_oversold": 30,
+                  "breakout_rsi": 50, "breakout_margin": 0.3}
+# generate_signal only ever sees the latest MAX_BARS candles, so averages such as the mean range
+# are taken over the same trailing window here.
+WINDOW = 500
+WARMUP = 200
+MAX_HOLD = 500
+
+def _prev(x, n=1):
+    return np.concatenate([np.full(n, np.nan), x[:-n]])
+
+@lru_cache(maxsize=64)
+def load_features(pair, granularity, directory=None):
+    df = CandleArchive(directory).read(pair, granularity)
+    if df.empty:
+        return None
+    df = calculate_indicators(df, np.float64)
+    o, h, l, c = (df[column].to_numpy(dtype=float) for column in ("open", "high", "low", "close"))
+    f = {column: df[column].to_numpy(dtype=float) for column in ("close", "high", "low", "atr", "rsi", "adx")}
+    f["time"] = df.index
+    # Patterns, structure and levels on every bar from the same detector pass as the live signal.
+    found = detect(o, h, l, c, WINDOW)
+    f["bullish"] = bullish(found)
+    f["bearish"] = bearish(found)
+    f["support"] = found["support"]
+    f["resistance"] = found["resistance"]
+    f["prev_close"] = _prev(c)
+    f["range"] = h - l
+    sma50, sma200 = df["sma50"].to_numpy(), df["sma200"].to_numpy()
+    f["cross_up"] = (_prev(sma50) < _prev(sma200)) & (sma50 > sma200)
+    f["cross_down"] = (_prev(sma50) > _prev(sma200)) & (sma50 < sma200)
+    macd, signal = df["macd"].to_numpy(), df["macd_signal"].to_numpy()
+    f["macd_bull"] = (_prev(macd) < _prev(signal)) & (macd > signal)
+    f["macd_bear"] = (_prev(macd) > _prev(signal)) & (macd < signal)
+    return f
+
+def signals(f, params):
+    # The generate_signal rule set on every bar at once: +1 BUY, -1 SELL, 0 HOLD.
+    rsi, close = f["rsi"], f["close"]
+    margin = f["range"] * params["breakout_margin"]
+    breakout_up = (f["prev_close"] < f["resistance"]) & (close > f["resistance"]) & (close - f["resistance"] > margin)
+    breakout_down = (f["prev_close"] > f["support"]) & (close < f["support"]) & (f["support"] - close > margin)
+    out = np.select([
+        f["bullish"] & f["cross_up"] & ~(rsi > params["rsi_overbought"]) & f["macd_bull"],
+        f["bearish"] & f["cross_down"] & ~(rsi < params["rsi_oversold"]) & f["macd_bear"],
+        breakout_up & (rsi > params["breakout_rsi"]),
+        breakout_down & (rsi < params["breakout_rsi"]),
+    ], [1, -1, 1, -1], 0)
+    out[:WARMUP] = 0
+    return out
+
+def simulate(f, side, params, max_hold=MAX_HOLD):
+    # Entry at the signal bar's close; exits at the first later bar whose range touches SL or TP.
+    # When a bar touches both, the stop is assumed to fill first.
+    entries = np.flatnonzero(side)
+    entries = entries[~np.isnan(f["atr"][entries])]
+    if not len(entries):
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0)
+    n = len(f["close"])
+    direction = side[entries]
+    entry = f["close"][entries]
+    risk = f["atr"][entries] * params["sl_mult"]
+    stop = entry - direction * risk
+    target = entry + direction * f["atr"][entries] * params["tp_mult"]
+
+    ahead = np.arange(1, max_hold + 1)
+    rows = np.minimum(entries[:, None] + ahead, n - 1)
+    valid = entries[:, None] + ahead < n
+    highs, lows = f["high"][rows], f["low"][rows]
+    long = direction[:, None] > 0
+    stopped = valid & np.where(long, lows <= stop[:, None], highs >= stop[:, None])
+    hit = valid & np.where(long, highs >= target[:, None], lows <= target[:, None])
+    first_stop = np.where(stopped.any(axis=1), stopped.argmax(axis=1), max_hold)
+    first_target = np.where(hit.any(axis=1), hit.argmax(axis=1), max_hold)
+    last = np.minimum(entries + max_hold, n - 1)
+    exits = np.where(first_stop <= first_target, entries + first_stop + 1, entries + first_target + 1)
+    timed_out = np.minimum(first_stop, first_target) == max_hold
+    exits = np.where(timed_out, last, exits)
+    pnl = np.where(first_stop <= first_target, -1.0, params["tp_mult"] / params["sl_mult"])
+    pnl = np.where(timed_out, direction * (f["close"][last] - entry) / risk, pnl)
+
+    # One position at a time: drop signals that fire while a trade is still open.
+    taken, busy_until = [], -1
+    for i, (start, end) in enumerate(zip(entries, exits)):
+        if start > busy_until:
+            taken.append(i)
+            busy_until = end
+    taken = np.array(taken, dtype=int)
+    return entries[taken], exits[taken], pnl[taken]
+
+def summarize(pair, pnl, params):
+    equity = np.cumsum(pnl)
+    drawdown = np.max(np.maximum.accumulate(np.concatenate([[0.0], equity]))[1:] - equity, initial=0.0)
+    return dict(pair=pair, **params, trades=len(pnl), win_rate=float(np.mean(pnl > 0)) if len(pnl) else 0.0,
+                expectancy_r=float(np.mean(pnl)) if len(pnl) else 0.0, total_r=float(equity[-1]) if len(pnl) else 0.0,
+                max_drawdown_r=float(drawdown))
+
+def backtest(pair, granularity, params=None, directory=None):
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    f = load_features(pair, granularity, directory)
+    if f is None:
+        return None
+    _, _, pnl = simulate(f, signals(f, params), params)
+    return summarize(pair, pnl, params)
+
+def _run(job):
+    return backtest(*job)
+
+def sweep(pairs, granularity, grid, directory=None, workers=None):
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    # Group jobs by pair so each worker loads and prepares a pair's history once.
+    jobs = [(pair, granularity, combo, directory) for pair in pairs for combo in combos]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        results = pool.map(_run, jobs, chunksize=max(1, len(combos)))
+        return pd.DataFrame([result for result in results if result is not None])
+
+def _floats(text):
+    return [float(value) for value in text.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized backtests of the generate_signal rules on cached candles.")
+    parser.add_argument("--pairs", default=",".join(PAIRS))
+    parser.add_argument("--granularity", default="H1")
+    parser.add_argument("--data", default=None, help="candle directory (default: config candle_dir)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    download = sub.add_parser("download", help="fetch history from OANDA into the candle directory")
+    download.add_argument("--bars", type=int, default=20000)
+    sub.add_parser("run", help="backtest the default parameters")
+    grid = sub.add_parser("sweep", help="parameter sweep across processes")
+    grid.add_argument("--sl", default="1,1.5,2")
+    grid.add_argument("--tp", default="2,3,4")
+    grid.add_argument("--rsi-overbought", default="65,70,75")
+    grid.add_argument("--rsi-oversold", default="25,30,35")
+    grid.add_argument("--breakout-rsi", default="45,50,55")
+    grid.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+    pairs = args.pairs.split(",")
+
+    if args.command == "download":
+        # Only the bars after the archived tail are fetched and appended.
+        archive = CandleArchive(args.data)
+        for pair in pairs:
+            df = fetch_history(pair, args.granularity, args.bars, archive.last_time(pair, args.granularity))
+            added = archive.append(pair, args.granularity, df)
+            print(f"{pair}: {added} new bars, {archive.length(pair, args.granularity)} archived")
+        return
+    if args.command == "run":
+        results = pd.DataFrame([r for r in (backtest(pair, args.granularity, directory=args.data) for pair in pairs) if r])
+    else:
+        grid = {"sl_mult": _floats(args.sl), "tp_mult": _floats(args.tp), "rsi_overbought": _floats(args.rsi_overbought),
+                "rsi_oversold": _floats(args.rsi_oversold), "breakout_rsi": _floats(args.breakout_rsi)}
+        results = sweep(pairs, args.granularity, grid, args.data, args.workers or None)
+    if results.empty:
+        print("No cached candles found; run the download command first.")
+        return
+    print(results.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,945 @@
+import argparse
+import json
+import threading
+from datetime import timedelta
+from time import perf_counter, sleep
+
+import numpy as np
+
+import oanda
+import trading_strategy
+from reference import legacy_detect, legacy_parse_candles
+from stubs import (STUB_START, FakeClock, StubOanda, currency_frames, send_spacing, simulate_delivery, stub_candles,
+                   stub_frame)
+
+
+def bench_fetch(args):
+    pair_counts = [int(n) for n in args.pairs.split(",")]
+    levels = [int(n) for n in args.concurrency.split(",")]
+    with StubOanda(latency=args.latency, rate_limit_every=args.rate_limit_every) as server:
+        oanda.BASE_URL = server.base_url
+        print(f"stub latency {args.latency * 1000:.0f} ms, 500 candles per request")
+        print(f"{'pairs':>6} {'workers':>8} {'wall s':>8} {'pairs/s':>8}")
+        for n in pair_counts:
+            pairs = [f"P{i:03d}_USD" for i in range(n)]
+            for workers in levels:
+                trading_strategy.STORE.clear()
+                trading_strategy.INDICATORS.clear()
+                trading_strategy.SIGNAL_CACHE.clear()
+                start = perf_counter()
+                signals = trading_strategy.get_all_signals(pairs, "H1", max_workers=workers)
+                wall = perf_counter() - start
+                assert len(signals) == n, f"expected {n} signals, got {len(signals)}"
+                print(f"{n:>6} {workers:>8} {wall:>8.3f} {n / wall:>8.1f}")
+
+
+def bench_store(args):
+    from candle_store import CandleStore
+
+    pairs = [f"P{i:03d}_USD" for i in range(args.pairs)]
+    with StubOanda(bars=1000) as server:
+        oanda.BASE_URL = server.base_url
+        store = CandleStore()
+
+        def measure(label, fetch):
+            sent = server.bytes_sent
+            start = perf_counter()
+            for pair in pairs:
+                fetch(pair)
+            wall = perf_counter() - start
+            payload = (server.bytes_sent - sent) / len(pairs)
+            print(f"{label:<22} {payload / 1024:>10.1f} KiB/pair {wall / len(pairs) * 1000:>8.2f} ms/pair")
+            return payload, wall
+
+        full_bytes, full_wall = measure("full fetch_data(500)", lambda p: trading_strategy.fetch_data(p, "H1"))
+        measure("store cold start", lambda p: store.get(p, "H1"))
+        server.bars += 1
+        inc_bytes, inc_wall = measure("store +1 bar", lambda p: store.get(p, "H1"))
+        print(f"payload reduction {full_bytes / inc_bytes:.0f}x, wall reduction {full_wall / inc_wall:.1f}x")
+
+
+def bench_indicators(args):
+    from indicators import IndicatorEngine
+
+    # Stream a rolling 500-bar window forward bar by bar, with a forming bar on every step.
+    engine = IndicatorEngine()
+    steps = args.steps
+    recompute = incremental = 0.0
+    for step in range(steps):
+        df = stub_frame("EUR_USD", 500, start=step)
+        start = perf_counter()
+        engine.sync(df, df.index[-2])
+        incremental += perf_counter() - start
+        start = perf_counter()
+        trading_strategy.calculate_indicators(df.copy())
+        recompute += perf_counter() - start
+    print(f"full recompute   {recompute / steps * 1000:8.3f} ms/update")
+    print(f"streaming engine {incremental / steps * 1000:8.3f} ms/update (includes frame build)")
+    state = engine.state
+    start = perf_counter()
+    for i in range(10000):
+        state.step(1.1 + i * 1e-5, 1.09, 1.095 + i * 1e-5)
+    print(f"state update     {(perf_counter() - start) / 10000 * 1e6:8.1f} us/candle")
+
+
+def bench_panel(args):
+    import panel
+
+    for count in (int(n) for n in args.pairs.split(",")):
+        # Mixed history lengths exercise the NaN padding and the short-history SMA200 fallback.
+        frames = {f"P{i:03d}_USD": stub_frame(f"P{i:03d}_USD", (40, 120, 500)[i % 3] if i < 6 else 500, start=i * 7)
+                  for i in range(count)}
+        start = perf_counter()
+        for df in frames.values():
+            trading_strategy.generate_signal(df.copy())
+        per_pair = perf_counter() - start
+        start = perf_counter()
+        panel.generate_signals(frames)
+        batched = perf_counter() - start
+        print(f"{count:>5} pairs: per-pair {per_pair * 1000:8.1f} ms, panel {batched * 1000:8.1f} ms "
+              f"({per_pair / batched:.1f}x)")
+
+
+def bench_cache(args):
+    import execution
+
+    pairs = trading_strategy.PAIRS
+    cache = trading_strategy.SIGNAL_CACHE
+    with StubOanda(latency=args.latency) as server:
+        oanda.BASE_URL = server.base_url
+        for label, fetch in (("per-pair", trading_strategy.get_all_signals), ("panel", execution.compute_all_signals)):
+            trading_strategy.STORE.clear()
+            cache.clear()
+            before = dict(cache.stats(), requests=server.requests)
+            # Simulate a burst of users tapping "Compare all" at the same moment.
+            results = [None] * args.users
+            threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, fetch(pairs, "H1")))
+                       for i in range(args.users)]
+            start = perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            burst = perf_counter() - start
+            start = perf_counter()
+            fetch(pairs, "H1")
+            warm = perf_counter() - start
+            stats = cache.stats()
+            assert all(len(result) == len(pairs) for result in results)
+            print(f"{label:<9} {args.users} users: {server.requests - before['requests']} candle requests, "
+                  f"burst {burst:.2f} s, warm call {warm * 1000:.2f} ms, "
+                  f"hits {stats['hits'] - before['hits']} merged {stats['merged'] - before['merged']} "
+                  f"misses {stats['misses'] - before['misses']}")
+
+
+class FakeMessage:
+    def __init__(self):
+        self.photos = []
+
+    async def reply_photo(self, photo=None, caption=None):
+        self.photos.append(photo)
+
+    async def reply_text(self, text, reply_markup=None):
+        pass
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.message = FakeMessage()
+
+    async def answer(self):
+        pass
+
+    async def edit_message_text(self, text, reply_markup=None):
+        pass
+
+
+class FakeUpdate:
+    def __init__(self, data):
+        self.callback_query = FakeQuery(data)
+        self.message = self.callback_query.message
+
+
+def bench_handlers(args):
+    import asyncio
+    import os
+    import shutil
+    import tempfile
+
+    import bot
+    import execution
+    from graphics import generate_comparison_chart
+
+    # Keep the bot's state files out of the repo; the spawned CPU workers read config.json from here.
+    workdir = tempfile.mkdtemp()
+    shutil.copy("config.json", workdir)
+    os.chdir(workdir)
+    for future in execution.start():
+        future.result()
+
+    async def inline_compare_all(update, context):
+        # The pre-execution-layer handler: blocking fetch, compute and render on the event loop.
+        signals = execution.compute_all_signals(bot.pairs, bot.granularity)
+        generate_comparison_chart(signals)
+
+    async def light_taps(stop):
+        # Taps are due on a fixed schedule; latency is completion time minus due time, so loop stalls count.
+        latencies = []
+        due = perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(max(0.0, due - perf_counter()))
+            await bot.button(FakeUpdate("eur_menu"), None)
+            latencies.append(perf_counter() - due)
+            due += args.interval
+        return latencies
+
+    async def scenario(heavy):
+        trading_strategy.STORE.clear()
+        trading_strategy.SIGNAL_CACHE.clear()
+        stop = asyncio.Event()
+        users = [asyncio.create_task(light_taps(stop)) for _ in range(args.users)]
+        await asyncio.sleep(args.interval)
+        start = perf_counter()
+        await heavy(FakeUpdate("compare_all"), None)
+        heavy_wall = perf_counter() - start
+        stop.set()
+        latencies = sorted(sum(await asyncio.gather(*users), []))
+        return heavy_wall, latencies
+
+    with StubOanda(latency=args.latency) as server:
+        oanda.BASE_URL = server.base_url
+        print(f"{args.users} users tapping menus while one 'Compare all' runs ({len(bot.pairs)} pairs)")
+        for label, heavy in (("inline", inline_compare_all), ("offloaded", bot.button)):
+            heavy_wall, latencies = asyncio.run(scenario(heavy))
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            print(f"{label:<10} compare_all {heavy_wall:6.2f} s | light taps n={len(latencies):<5} "
+                  f"p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  max {latencies[-1] * 1000:8.2f} ms")
+
+        async def chart_taps():
+            updates = [FakeUpdate("eur_charts") for _ in range(args.users)]
+            await asyncio.gather(*(bot.button(update, None) for update in updates))
+            return [update.callback_query.message.photos for update in updates]
+
+        start = perf_counter()
+        sent = asyncio.run(chart_taps())
+        eur_pairs = [pair for pair in bot.pairs if pair.startswith("EUR_")]
+        assert all(len(photos) == len(eur_pairs) and all(photo.startswith(b"\x89PNG") for photo in photos)
+                   for photos in sent)
+        print(f"{args.users} concurrent EUR chart taps: {perf_counter() - start:.2f} s, "
+              f"chart cache {execution.CHARTS.stats()}")
+    execution.shutdown()
+
+
+def legacy_chart(df, pair):
+    # Baseline: the previous renderer, which built and laid out a new figure for every chart.
+    import io
+
+    import matplotlib.pyplot as plt
+
+    fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(10, 8), height_ratios=[3, 1, 1], sharex=True)
+    ax1.plot(df.index, df["close"], label="Close", color="blue")
+    ax1.plot(df.index, df["sma50"], label="SMA50", color="orange")
+    ax1.plot(df.index, df["sma200"], label="SMA200", color="green")
+    support, resistance = df["low"].rolling(window=20).min().iloc[-1], df["high"].rolling(window=20).max().iloc[-1]
+    ax1.axhline(support, color="green", linestyle="--", label=f"S: {support:.5f}")
+    ax1.axhline(resistance, color="red", linestyle="--", label=f"R: {resistance:.5f}")
+    ax1.set_title(f"{pair} Price Action")
+    ax1.legend()
+    ax1.grid(True)
+    ax2.plot(df.index, df["rsi"], label="RSI", color="purple")
+    ax2.axhline(70, color="red", linestyle="--")
+    ax2.axhline(30, color="green", linestyle="--")
+    ax2.set_ylim(0, 100)
+    ax2.set_title("RSI")
+    ax2.legend()
+    ax2.grid(True)
+    ax3.plot(df.index, df["macd"], label="MACD", color="blue")
+    ax3.plot(df.index, df["macd_signal"], label="Signal", color="orange")
+    ax3.bar(df.index, df["macd_hist"], label="Hist", color="gray", alpha=0.5)
+    ax3.axhline(0, color="black", linestyle="--")
+    ax3.set_title("MACD")
+    ax3.legend()
+    ax3.grid(True)
+    plt.tight_layout()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format="png", dpi=100)
+    plt.close()
+    return buffer.getvalue()
+
+
+def bench_charts(args):
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    import graphics
+
+    frames = {f"P{i:03d}_USD": trading_strategy.calculate_indicators(stub_frame(f"P{i:03d}_USD", 500, start=i))
+              for i in range(args.pairs)}
+
+    def timed(label, render):
+        start = perf_counter()
+        images = render()
+        wall = perf_counter() - start
+        assert all(image.startswith(b"\x89PNG") for image in images)
+        print(f"{label:<28} {len(images) / wall:8.1f} charts/s  ({wall:.2f} s for {len(images)})")
+        return images
+
+    timed("legacy (new figure each)", lambda: [legacy_chart(df, pair) for pair, df in frames.items()])
+    graphics.warm_up()
+    images = timed("template, one process", lambda: [graphics.generate_chart(df, pair) for pair, df in frames.items()])
+    workers = args.workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(graphics.warm_up, range(workers)))
+        timed(f"template, {workers} processes",
+              lambda: list(pool.map(graphics.generate_chart, frames.values(), frames.keys())))
+    if args.save:
+        with open(args.save, "wb") as f:
+            f.write(images[0])
+
+
+def bench_stream(args):
+    import price_stream
+
+    pairs = trading_strategy.PAIRS
+    signals = []
+    with StubOanda(bars=1000) as server:
+        oanda.BASE_URL = price_stream.STREAM_URL = server.base_url
+        trading_strategy.STORE.clear()
+        trading_strategy.SIGNAL_CACHE.clear()
+        rounds_per_bar = int(3600 / server.stream_step)
+        server.stream_rounds = rounds_per_bar * args.bars + 1
+        server.stream_drop_after = len(pairs) * rounds_per_bar // 2 if args.drop else 0
+        stream = price_stream.PriceStream(pairs, "H1", on_signal=lambda pair, data: signals.append(pair),
+                                          heartbeat_timeout=2)
+        price_stream.MAX_RECONNECT_DELAY = 0.1
+        start = perf_counter()
+        stream.start()
+        expected_closes = len(pairs) * args.bars
+        while stream.bars_closed < expected_closes and perf_counter() - start < args.timeout:
+            sleep(0.01)
+        stream.stop()
+        wall = perf_counter() - start
+        last = {pair: trading_strategy.STORE.get(pair, "H1", refresh=False).attrs["last_complete"] for pair in pairs}
+        expected = STUB_START + timedelta(hours=999 + args.bars - 1)
+        print(f"{len(pairs)} pairs, {args.bars} simulated H1 closes in {wall:.2f} s, "
+              f"{stream.reconnects} reconnect(s), {stream.bars_closed} bars closed, {len(signals)} signals")
+        print(f"latest complete bar in store: {min(last.values())} (expected {expected})")
+        lagging = sorted(pair for pair, time in last.items() if time != expected)
+        assert not lagging, f"pairs behind the stream: {lagging}"
+        print(f"tick-to-signal latency: {stream.latency_stats()}")
+
+
+def bench_backtest(args):
+    import tempfile
+
+    import backtest
+    from candle_archive import CandleArchive
+
+    directory = tempfile.mkdtemp()
+    pairs = [f"P{i:03d}_USD" for i in range(args.pairs)]
+    archive = CandleArchive(directory)
+    for pair in pairs:
+        archive.append(pair, "H1", stub_frame(pair, args.bars))
+
+    pair = pairs[0]
+    start = perf_counter()
+    result = backtest.backtest(pair, "H1", directory=directory)
+    vectorized = perf_counter() - start
+    df = stub_frame(pair, args.bars)
+    checks = np.random.default_rng(0).integers(backtest.WINDOW, args.bars, args.samples)
+    start = perf_counter()
+    for i in checks:
+        trading_strategy.generate_signal(df.iloc[i - backtest.WINDOW + 1:i + 1].copy())
+    per_bar = (perf_counter() - start) / len(checks)
+    print(f"bar-by-bar generate_signal: {per_bar * 1000:.2f} ms/bar -> ~{per_bar * args.bars:.1f} s for {args.bars} bars")
+    print(f"vectorized backtest:        {vectorized:.3f} s for {args.bars} bars (incl. load and indicators)")
+    print(f"  {result}")
+
+    grid = {"sl_mult": [1.0, 1.5, 2.0], "tp_mult": [2.0, 3.0, 4.0], "rsi_overbought": [70, 75], "rsi_oversold": [25, 30]}
+    combos = int(np.prod([len(values) for values in grid.values()]))
+    start = perf_counter()
+    results = backtest.sweep(pairs, "H1", grid, directory, workers=args.workers or None)
+    print(f"sweep: {len(results)} runs ({len(pairs)} pairs x {combos} combos) in {perf_counter() - start:.2f} s")
+
+
+def bench_parse(args):
+    from candle_store import parse_candles
+
+    for count in (int(n) for n in args.candles.split(",")):
+        body = json.dumps(stub_candles("EUR_USD", 0, count)).encode()
+        candles = json.loads(body)["candles"]
+        rounds = max(1, args.repeat * 500 // count)
+        timings = {}
+        for label, func in (("json.loads", lambda: json.loads(body)), ("legacy parser", lambda: legacy_parse_candles(candles)),
+                            ("numpy parser", lambda: parse_candles(candles))):
+            start = perf_counter()
+            for _ in range(rounds):
+                func()
+            timings[label] = (perf_counter() - start) / rounds * 1000
+        print(f"{count:>5} candles: " + ", ".join(f"{label} {ms:.2f} ms" for label, ms in timings.items())
+              + f" -> {timings['legacy parser'] / timings['numpy parser']:.1f}x")
+
+
+def bench_timeframes(args):
+    import execution
+    from timeframes import Resampler, higher_timeframes, resample
+
+    pair = "EUR_USD"
+    full = stub_frame(pair, args.bars)
+    for tf in higher_timeframes("H1"):
+        # Walk a 500-bar base window forward one bar at a time, with the last bar still forming:
+        # the incremental update against resampling every base bar so far.
+        resampler = Resampler()
+        incremental = rebuild = 0.0
+        for end in range(500, args.bars):
+            window = full.iloc[end - 500:end + 1].copy()
+            window.iloc[-1, window.columns.get_loc("close")] = window["open"].iloc[-1]
+            window.attrs["last_complete"] = window.index[-2]
+            start = perf_counter()
+            frame = resampler.frame(pair, "H1", tf, window)
+            incremental += perf_counter() - start
+            start = perf_counter()
+            resample(full.iloc[:end + 1], tf, window.index[-2], "H1")
+            rebuild += perf_counter() - start
+        steps = args.bars - 500
+        print(f"{tf}: incremental update {incremental / steps * 1e6:.0f} us, "
+              f"rebuild from all base bars {rebuild / steps * 1e6:.0f} us ({len(frame)} {tf} bars kept)")
+
+    pairs = trading_strategy.PAIRS
+    with StubOanda(bars=1000) as server:
+        oanda.BASE_URL = server.base_url
+        for label, fetch in (("per-pair", trading_strategy.get_all_signals), ("panel", execution.compute_all_signals)):
+            trading_strategy.STORE.clear()
+            trading_strategy.RESAMPLER.clear()
+            trading_strategy.SIGNAL_CACHE.clear()
+            requests = server.requests
+            start = perf_counter()
+            signals = fetch(pairs, "H1")
+            wall = perf_counter() - start
+            bias, views = signals[pairs[0]]["bias"], signals[pairs[0]]["timeframes"]
+            print(f"{label:<9} {len(pairs)} pairs, {server.requests - requests} requests, {wall:.2f} s, "
+                  f"{pairs[0]}: H1 {bias}, {views}")
+
+
+def bench_orders(args):
+    import asyncio
+
+    from orders import OrderExecutor
+
+    pairs = trading_strategy.PAIRS
+    signals = {pair: {"signal": ("BUY", "SELL")[i % 2], "sl": 1.0, "tp": 1.2, "df": stub_frame(pair, 2)}
+               for i, pair in enumerate(pairs)}
+    with StubOanda() as server:
+        oanda.BASE_URL = server.base_url
+        server.order_latency = args.latency
+
+        start = perf_counter()
+        for pair, data in signals.items():
+            trading_strategy.place_order(data["signal"], pair, sl=data["sl"], tp=data["tp"])
+        serial = perf_counter() - start
+        print(f"{len(pairs)} orders one after another (place_order): {serial:.2f} s")
+
+        async def run():
+            executor = OrderExecutor(workers=args.workers, timeout=args.timeout).start()
+            start = perf_counter()
+            queued = await executor.submit_all(signals, "H1")
+            await executor.join()
+            wall = perf_counter() - start
+            await executor.stop()
+            return executor, queued, wall
+
+        for faults in (False, True):
+            server.orders.clear()
+            server.fills.clear()
+            server.order_error_every = args.error_every if faults else 0
+            server.order_hang_every = args.hang_every if faults else 0
+            server.order_hang = args.timeout * 3
+            posts = server.order_posts
+            executor, queued, wall = asyncio.run(run())
+            stats = executor.stats()
+            latency = stats["latency"]
+            print(f"{queued} orders through the executor ({args.workers} workers"
+                  f"{', injected 503s and lost responses' if faults else ''}): {wall:.2f} s, "
+                  f"{server.order_posts - posts} POSTs, {sum(server.fills.values())} fills, {stats['recovered']} recovered; "
+                  f"submit-to-ack p50 {latency['p50_ms']:.0f} ms, p99 {latency['p99_ms']:.0f} ms")
+
+
+def bench_archive(args):
+    import tempfile
+
+    import execution
+    from candle_archive import CandleArchive
+
+    pairs = trading_strategy.PAIRS
+    store = trading_strategy.STORE
+    archive = CandleArchive(tempfile.mkdtemp())
+
+    def restart(label, server, use_archive):
+        store.archive = archive if use_archive else None
+        store.clear()
+        trading_strategy.INDICATORS.clear()
+        trading_strategy.RESAMPLER.clear()
+        trading_strategy.SIGNAL_CACHE.clear()
+        requests, sent = server.requests, server.bytes_sent
+        start = perf_counter()
+        execution.compute_all_signals(pairs, "H1")
+        wall = perf_counter() - start
+        print(f"{label:<30} {wall:>7.3f} s to first signals, {server.requests - requests:>3} requests, "
+              f"{(server.bytes_sent - sent) / 1024:>8.1f} KiB")
+
+    with StubOanda(latency=args.latency, bars=1000) as server:
+        oanda.BASE_URL = server.base_url
+        print(f"{len(pairs)} pairs, stub latency {args.latency * 1000:.0f} ms")
+        restart("first run (empty archive)", server, True)
+        server.bars += args.gap
+        restart(f"restart, archive + {args.gap}-bar gap", server, True)
+        restart("restart without archive", server, False)
+
+        # A gap wider than the window is paged forward so the archive has no holes.
+        server.bars += args.long_gap
+        restart(f"restart, archive + {args.long_gap}-bar gap", server, True)
+
+    pair = "P000_USD"
+    archive.append(pair, "H1", stub_frame(pair, args.history))
+    for label, read in (("latest 500 bars (memory-mapped)", lambda: archive.read(pair, "H1", bars=500)),
+                        ("one month by time", lambda: archive.read(pair, "H1", STUB_START + timedelta(days=30),
+                                                                   STUB_START + timedelta(days=60))),
+                        (f"full {args.history}-bar history", lambda: archive.read(pair, "H1"))):
+        start = perf_counter()
+        for _ in range(20):
+            read()
+        print(f"read {label:<32} {(perf_counter() - start) / 20 * 1000:>8.2f} ms")
+
+
+def bench_schedule(args):
+    import asyncio
+
+    import execution
+    from scheduler import CandleScheduler, market_open
+
+    pairs = trading_strategy.PAIRS
+    # A Friday 00:30 UTC start, so the run crosses the Friday 22:00 UTC close and the Sunday reopen.
+    begin = STUB_START + timedelta(days=32, minutes=30)
+    end = begin + timedelta(hours=args.hours)
+
+    async def run(scheduler, clock):
+        closes = []
+        while scheduler.plan(clock.now)[0] <= end:
+            close, due, changed = await scheduler.step()
+            closes.append((close, due))
+        return closes
+
+    with StubOanda(bars=int((begin - STUB_START).total_seconds() // 3600) + 1) as server:
+        oanda.BASE_URL = server.base_url
+        trading_strategy.STORE.clear()
+        trading_strategy.RESAMPLER.clear()
+        trading_strategy.SIGNAL_CACHE.clear()
+        clock = FakeClock(begin, server)
+        calls, posts = [], []
+
+        async def evaluate(chunk, granularity):
+            calls.append(clock.now)
+            return execution.compute_all_signals(chunk, granularity)
+
+        async def publish(changed):
+            posts.append(len(changed))
+
+        # First signals for every pair, as the bot has after its first close.
+        scheduler = CandleScheduler(pairs, "H1", evaluate, publish, clock=clock, sleep=clock.sleep)
+        scheduler.last = {pair: data["signal"] for pair, data in execution.compute_all_signals(pairs, "H1").items()}
+        requests = server.requests
+        closes = asyncio.run(run(scheduler, clock))
+        close, due = closes[0]
+        first = [call - close for call in calls[:-(-len(due) // oanda.MAX_CONCURRENCY)]]
+        ticks = args.hours * 4
+        print(f"{len(pairs)} pairs, H1, {args.hours} h from {begin:%a %Y-%m-%d %H:%M} UTC")
+        print(f"15-minute loop: {ticks} runs, >= {args.hours * len(pairs)} candle requests, "
+              f"{ticks * len(pairs)} signal posts + {ticks} comparison charts")
+        print(f"close scheduler: {scheduler.closes} closes, {server.requests - requests} candle requests, "
+              f"{scheduler.published} signal posts + {len(posts)} comparison charts")
+        print(f"BTC_USD evaluated on {sum('BTC_USD' in due for _, due in closes)} closes, EUR_USD on "
+              f"{sum('EUR_USD' in due for _, due in closes)}; first close's calls at "
+              f"+{', +'.join(f'{d.total_seconds():.1f}' for d in first)} s")
+
+    # M5 against the planner alone: every bar close is evaluated, where a 15-minute loop sees one in three.
+    # The stub's random walk never leaves HOLD, so here signals flip on about one close in ten.
+    trading_strategy.SIGNAL_CACHE.clear()
+    clock = FakeClock(begin)
+    rng = np.random.default_rng(0)
+    current, pushed = ["HOLD"], []
+
+    async def evaluate(chunk, granularity):
+        if rng.random() < 0.1:
+            current[0] = str(rng.choice(["BUY", "SELL", "HOLD"]))
+        return {pair: {"signal": current[0]} for pair in chunk}
+
+    async def publish(changed):
+        pushed.append(changed)
+
+    scheduler = CandleScheduler(["EUR_USD"], "M5", evaluate, publish, clock=clock, sleep=clock.sleep)
+    closes = asyncio.run(run(scheduler, clock))
+    open_bars = sum(market_open("EUR_USD", begin.replace(minute=30) + timedelta(minutes=5 * i))
+                    for i in range(args.hours * 12))
+    print(f"M5: {len(closes)} of {open_bars} open-market bars evaluated (15-minute loop: {open_bars // 3}), "
+          f"{len(pushed)} changed signals pushed")
+
+
+def bench_stats(args):
+    import asyncio
+    from urllib.request import urlopen
+
+    import execution
+    from metrics import STAGES, TIMINGS, Timings, serve_metrics
+
+    scratch = Timings()
+    start = perf_counter()
+    for i in range(args.samples):
+        with scratch.time("fetch", pair="EUR_USD"):
+            pass
+    per_call = (perf_counter() - start) / args.samples
+    print(f"instrumentation overhead: {per_call * 1e6:.2f} us per timed stage")
+
+    pairs = trading_strategy.PAIRS
+    with StubOanda(latency=args.latency, bars=1000) as server:
+        oanda.BASE_URL = server.base_url
+
+        async def cycle():
+            signals = await execution.get_all_signals(pairs, "H1")
+            await execution.render_charts(signals, "H1")
+            await execution.render_comparison(signals, "H1")
+
+        TIMINGS.clear()
+        start = perf_counter()
+        for _ in range(args.cycles):
+            trading_strategy.SIGNAL_CACHE.clear()
+            execution.CHARTS = execution.ChartCache()
+            server.bars += 1
+            asyncio.run(cycle())
+        wall = perf_counter() - start
+        timed = sum(snapshot["count"] for snapshot in TIMINGS.snapshot().values())
+        snapshots = TIMINGS.snapshot()
+        print(f"{args.cycles} update cycles for {len(pairs)} pairs in {wall:.2f} s, {timed} timed stages "
+              f"(~{timed * per_call / wall * 100:.3f}% overhead)")
+        for stage in STAGES:
+            if stage in snapshots:
+                snapshot = snapshots[stage]
+                print(f"  {stage:<11} p50 {snapshot['p50_ms']:>7.2f} ms  p99 {snapshot['p99_ms']:>7.2f} ms  "
+                      f"max {snapshot['max_ms']:>7.2f} ms  ({snapshot['count']})")
+
+        metrics = serve_metrics(0)
+        try:
+            text = urlopen(f"http://127.0.0.1:{metrics.server_address[1]}/metrics").read().decode()
+        finally:
+            metrics.shutdown()
+        samples = [line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#")]
+        counts = {name.split("{")[1].rstrip("}"): int(value) for name, value in samples if name.startswith("fxbot_stage_seconds_count")}
+        infs = {name.split("{")[1].replace(',le="+Inf"}', ""): int(value) for name, value in samples if 'le="+Inf"' in name}
+        assert counts and counts == infs, "+Inf bucket must equal the count for every series"
+        assert sum(count for tags, count in counts.items() if tags.startswith('stage="fetch"')) == snapshots["fetch"]["count"]
+        print(f"/metrics: {len(samples)} samples in {len(counts)} series, {len(text) / 1024:.1f} KiB")
+
+        report = execution.profile_cycle(pairs[:args.profile_pairs], "H1", top=12)
+        print(f"profile of one cycle for {args.profile_pairs} pairs:")
+        print("\n".join(line for line in report.splitlines() if line.strip())[:3000])
+        execution.shutdown()
+
+
+# The string detectors generate_signal used before detectors.py, kept as the parity reference.
+
+
+def bench_detectors(args):
+    import detectors
+    import graphics
+
+    pair = "P000_USD"
+    df = trading_strategy.calculate_indicators(stub_frame(pair, args.bars))
+    start = perf_counter()
+    found = detectors.detect_frame(df)
+    full_pass = perf_counter() - start
+    flagged = np.flatnonzero((found["pattern"] != 0) | found["order_block"] | found["fvg"] | (found["structure"] != 0))
+    rng = np.random.default_rng(0)
+    checks = sorted(set(rng.choice(flagged[flagged >= 499], args.samples)) | set(rng.integers(499, args.bars, args.samples)))
+    legacy_time = new_time = 0.0
+    for i in checks:
+        window = df.iloc[i - 499:i + 1].copy()
+        start = perf_counter()
+        legacy_detect(window)
+        legacy_time += perf_counter() - start
+        start = perf_counter()
+        detectors.describe(detectors.at(detectors.detect_frame(window)))
+        new_time += perf_counter() - start
+    counts = {name: int(np.count_nonzero(found[name])) for name in ("pattern", "structure", "order_block", "fvg")}
+    print(f"detections in {args.bars} bars: {counts}")
+    print(f"latest bar, 500-bar window: string detectors {legacy_time / len(checks) * 1000:.2f} ms, "
+          f"detector pass {new_time / len(checks) * 1000:.2f} ms")
+    print(f"every bar of {args.bars}: bar-by-bar ~{legacy_time / len(checks) * args.bars:.1f} s, one pass {full_pass * 1000:.1f} ms")
+
+    charts = []
+    for end in range(500, args.bars + 1, 500):
+        window = df.iloc[end - 500:end]
+        zones = detectors.active_zones(detectors.detect_frame(window), window["high"].to_numpy(),
+                                       window["low"].to_numpy(), window.index)
+        charts.append((len(zones), end, zones))
+    count, end, zones = max(charts, key=lambda chart: chart[0])
+    image = graphics.generate_chart(df.iloc[end - 500:end], pair, zones)
+    print(f"active OB/FVG zones per 500-bar chart: mean {np.mean([chart[0] for chart in charts]):.1f}, "
+          f"max {count}: {[(kind, f'{start:%m-%d %H:%M}') for kind, start, _, _ in zones]}")
+    if args.save:
+        with open(args.save, "wb") as f:
+            f.write(image)
+
+
+def _memory_run(mode, count, bars, queue):
+    # One pipeline run in a fresh process, so ru_maxrss is this run's own peak.
+    import gc
+    import resource
+
+    import indicators
+    import panel
+
+    frames = {}
+    for i in range(count):
+        df = stub_frame(f"P{i:03d}_USD", bars, start=i)
+        # Store frames also carry the bid/ask closes and the spread.
+        frames[f"P{i:03d}_USD"] = df.assign(bid=df["close"] - 5e-5, ask=df["close"] + 5e-5, spread=1e-4)
+    gc.collect()
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if mode == "legacy":
+        # The frames signals carried before: a copy of the store frame with each indicator column
+        # inserted one at a time.
+        pairs, ohlc, lengths = panel.stack(frames)
+        ind = panel.calculate_indicators(ohlc, lengths)
+        panel.detect(ohlc["open"], ohlc["high"], ohlc["low"], ohlc["close"])
+        signals = {}
+        for i, pair in enumerate(pairs):
+            df = frames[pair].copy()
+            for column in indicators.COLUMNS:
+                df[column] = ind[column][i, -len(df):]
+            signals[pair] = {"df": df}
+    else:
+        indicators.DTYPE = np.dtype(mode)
+        signals = panel.generate_signals(frames)
+    gc.collect()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    retained = sum(int(data["df"].memory_usage(index=False).sum()) for data in signals.values())
+    queue.put((base, peak, retained))
+
+
+def bench_memory(args):
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    for count in (int(n) for n in args.pairs.split(",")):
+        print(f"{count} instruments x {args.bars} bars (RSS in MiB; frames = signal frames held by the cache)")
+        for mode in ("legacy", "float64", "float32"):
+            queue = ctx.Queue()
+            process = ctx.Process(target=_memory_run, args=(mode, count, args.bars, queue))
+            process.start()
+            base, peak, retained = queue.get()
+            process.join()
+            label = "copy + column inserts" if mode == "legacy" else f"indicator frame, {mode}"
+            print(f"  {label:<26} peak RSS {peak / 1024:7.1f} (+{(peak - base) / 1024:6.1f} over inputs), "
+                  f"frames {retained / 2 ** 20:6.2f} ({retained / count / 1024:5.1f} KiB/instrument)")
+
+
+def bench_correlation(args):
+    import pandas as pd
+
+    from correlation import CorrelationEngine, correlation, moments
+
+    print(f"per-close cost, window {args.window} (update = ingest the frames, commit one row, snapshot):")
+    for count in (int(n) for n in args.pairs.split(",")):
+        names = [f"X{i:03d}_USD" for i in range(count)]
+        rng = np.random.default_rng(count)
+        closes = np.exp(np.cumsum(rng.normal(0, 0.001, (args.history + args.repeat + 1, count)), axis=0))
+        index = pd.date_range(STUB_START, periods=len(closes), freq="h")
+        engine = CorrelationEngine(names, "H1", trading_strategy.MAJOR_CURRENCIES, args.window)
+
+        def views(end):
+            out = {}
+            for i, name in enumerate(names):
+                view = pd.DataFrame({"close": closes[max(end - 500, 0):end, i]}, index=index[max(end - 500, 0):end])
+                view.attrs["last_complete"] = view.index[-1]
+                out[name] = view
+            return out
+
+        engine.update(views(args.history))
+        prepared = [views(args.history + k + 1) for k in range(args.repeat)]
+        start = perf_counter()
+        for batch in prepared:
+            engine.update(batch)
+            engine.snapshot()
+        incremental = (perf_counter() - start) / args.repeat
+        # From scratch: align the window's returns across the same frames, then correlate.
+        repeat = max(1, args.repeat // 10)
+        start = perf_counter()
+        for batch in prepared[-repeat:]:
+            returns = pd.concat({name: np.log(df["close"]).diff() for name, df in batch.items()}, axis=1, sort=True)
+            returns.iloc[-args.window:].corr(min_periods=engine.min_bars).to_numpy()
+        rebuild = (perf_counter() - start) / repeat
+        window = returns.iloc[-args.window:].to_numpy()
+        valid = (~np.isnan(window)).astype(float)
+        start = perf_counter()
+        for _ in range(args.repeat):
+            correlation(moments(np.nan_to_num(window), valid), engine.min_bars)
+        full = (perf_counter() - start) / args.repeat
+        print(f"  {count:4d} instruments: incremental update {incremental * 1000:7.2f} ms, pandas align + corr "
+              f"{rebuild * 1000:8.2f} ms (of which the NumPy pairwise sums alone {full * 1000:6.2f} ms)")
+
+    if args.save:
+        from graphics import generate_comparison_chart
+
+        pairs = trading_strategy.PAIRS
+        frames = currency_frames(pairs, args.history)
+        engine = CorrelationEngine(pairs, "H1", trading_strategy.MAJOR_CURRENCIES, args.window)
+        engine.update(frames)
+        signals = {pair: {"strength": float(abs(np.log(frames[pair]["close"]).diff().iloc[-50:].sum()) * 100)} for pair in pairs}
+        with open(args.save, "wb") as f:
+            f.write(generate_comparison_chart(signals, engine.snapshot()))
+        print(f"comparison chart written to {args.save}")
+
+
+def bench_delivery(args):
+    import asyncio
+
+    rate, interval = 30.0 * args.scale, 1.0 / args.scale
+    print(f"send limits scaled x{args.scale:g}: {rate:.0f} msg/s per platform, {interval * 1000:.0f} ms between "
+          f"messages to one chat; every {args.fail_every}th send fails with a retry_after")
+    for count in (int(n) for n in args.subscribers.split(",")):
+        result = asyncio.run(simulate_delivery(count, rate, interval, args.latency, args.fail_every))
+        busiest, gap = send_spacing(result["sends"])
+        stats, planning = result["stats"], result["planning"]
+        messages = sum(s["sent"] for s in stats.values())
+        per_request = sum(len(wanted) for wanted in result["expected"].values())
+        print(f"  {count:5d} subscribers: publish {planning * 1000:6.1f} ms ({planning / count * 1e6:4.1f} us/subscriber), "
+              f"{len(result['rendered'])} renders (one per subscriber request: {per_request}), {messages} sent, "
+              f"{sum(s['replaced'] for s in stats.values())} replaced, {sum(s['retried'] for s in stats.values())} retried, "
+              f"in {result['wall']:.2f} s")
+        print(f"        busiest second {busiest} sends on one platform (limit {rate:.0f}), closest sends to one chat "
+              f"{gap * 1000:.1f} ms apart, p99 queue latency {stats['telegram']['latency']['p99_ms']:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks against a local stub OANDA server.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fetch = sub.add_parser("fetch", help="get_all_signals wall time vs pair count and concurrency")
+    fetch.add_argument("--pairs", default="1,9,27,54")
+    fetch.add_argument("--concurrency", default="1,4,8,16")
+    fetch.add_argument("--latency", type=float, default=0.05)
+    fetch.add_argument("--rate-limit-every", type=int, default=0)
+    fetch.set_defaults(func=bench_fetch)
+
+    store = sub.add_parser("store", help="full 500-candle fetch vs incremental CandleStore refresh")
+    store.add_argument("--pairs", type=int, default=27)
+    store.set_defaults(func=bench_store)
+
+    indicators = sub.add_parser("indicators", help="streaming indicator update cost against a full recompute")
+    indicators.add_argument("--steps", type=int, default=300)
+    indicators.set_defaults(func=bench_indicators)
+
+    panel = sub.add_parser("panel", help="per-pair generate_signal vs the batched NumPy panel")
+    panel.add_argument("--pairs", default="27,100,300")
+    panel.set_defaults(func=bench_panel)
+
+    cache = sub.add_parser("cache", help="concurrent users hitting the shared signal cache")
+    cache.add_argument("--users", type=int, default=10)
+    cache.add_argument("--latency", type=float, default=0.05)
+    cache.set_defaults(func=bench_cache)
+
+    handlers = sub.add_parser("handlers", help="menu tap latency while a heavy compare-all runs")
+    handlers.add_argument("--users", type=int, default=20)
+    handlers.add_argument("--interval", type=float, default=0.05)
+    handlers.add_argument("--latency", type=float, default=0.05)
+    handlers.set_defaults(func=bench_handlers)
+
+    charts = sub.add_parser("charts", help="charts per second: legacy renderer vs figure template vs worker processes")
+    charts.add_argument("--pairs", type=int, default=27)
+    charts.add_argument("--workers", type=int, default=0)
+    charts.add_argument("--save", help="write the first rendered chart to this path")
+    charts.set_defaults(func=bench_charts)
+
+    stream = sub.add_parser("stream", help="pricing stream ingestion against a stub stream, with a dropped connection")
+    stream.add_argument("--bars", type=int, default=5)
+    stream.add_argument("--drop", action=argparse.BooleanOptionalAction, default=True)
+    stream.add_argument("--timeout", type=float, default=60)
+    stream.set_defaults(func=bench_stream)
+
+    parse = sub.add_parser("parse", help="candle JSON parsing: per-candle dicts vs bulk NumPy decode")
+    parse.add_argument("--candles", default="500,5000")
+    parse.add_argument("--repeat", type=int, default=50)
+    parse.set_defaults(func=bench_parse)
+
+    tfs = sub.add_parser("timeframes", help="incremental higher-timeframe resampling parity and cost, no extra requests")
+    tfs.add_argument("--bars", type=int, default=6000)
+    tfs.set_defaults(func=bench_timeframes)
+
+    orders = sub.add_parser("orders", help="order pipeline against a mock order endpoint with retries and lost responses")
+    orders.add_argument("--latency", type=float, default=0.05)
+    orders.add_argument("--workers", type=int, default=8)
+    orders.add_argument("--timeout", type=float, default=0.3)
+    orders.add_argument("--error-every", type=int, default=7)
+    orders.add_argument("--hang-every", type=int, default=5)
+    orders.set_defaults(func=bench_orders)
+
+    arc = sub.add_parser("archive", help="restart-to-first-signal with and without the candle archive, and slice reads")
+    arc.add_argument("--latency", type=float, default=0.05)
+    arc.add_argument("--gap", type=int, default=24)
+    arc.add_argument("--long-gap", type=int, default=1200)
+    arc.add_argument("--history", type=int, default=20000)
+    arc.set_defaults(func=bench_archive)
+
+    bt = sub.add_parser("backtest", help="vectorized backtest against bar-by-bar generate_signal, and a sweep")
+    bt.add_argument("--pairs", type=int, default=4)
+    bt.add_argument("--bars", type=int, default=20000)
+    bt.add_argument("--samples", type=int, default=100)
+    bt.add_argument("--workers", type=int, default=0)
+    bt.set_defaults(func=bench_backtest)
+
+    sched = sub.add_parser("schedule", help="candle-close scheduler vs the 15-minute loop over a weekend, with a fake clock")
+    sched.add_argument("--hours", type=int, default=72)
+    sched.set_defaults(func=bench_schedule)
+
+    st = sub.add_parser("stats", help="stage timing overhead, per-stage latencies, the /metrics endpoint and a profiled cycle")
+    st.add_argument("--latency", type=float, default=0.02)
+    st.add_argument("--cycles", type=int, default=3)
+    st.add_argument("--samples", type=int, default=200000)
+    st.add_argument("--profile-pairs", type=int, default=3)
+    st.set_defaults(func=bench_stats)
+
+    det = sub.add_parser("detectors", help="vectorized detector pass vs the string detectors, and chart zones")
+    det.add_argument("--bars", type=int, default=20000)
+    det.add_argument("--samples", type=int, default=150)
+    det.add_argument("--save", help="write the chart with the most active zones to this path")
+    det.set_defaults(func=bench_detectors)
+
+    mem = sub.add_parser("memory", help="peak RSS and signal-frame size: column inserts vs float64/float32 indicator frames")
+    mem.add_argument("--pairs", default="27,500")
+    mem.add_argument("--bars", type=int, default=500)
+    mem.set_defaults(func=bench_memory)
+
+    corr = sub.add_parser("correlation", help="per-close cost of the incremental correlation engine against pandas")
+    corr.add_argument("--history", type=int, default=300)
+    corr.add_argument("--window", type=int, default=120)
+    corr.add_argument("--pairs", default="27,500")
+    corr.add_argument("--repeat", type=int, default=50)
+    corr.add_argument("--save", default="")
+    corr.set_defaults(func=bench_correlation)
+
+    dl = sub.add_parser("delivery", help="subscription fan-out through rate-limited send queues, against per-request delivery")
+    dl.add_argument("--subscribers", default="100,1000,5000")
+    dl.add_argument("--scale", type=float, default=100.0)
+    dl.add_argument("--latency", type=float, default=0.002)
+    dl.add_argument("--fail-every", type=int, default=50)
+    dl.set_defaults(func=bench_delivery)
+
+    args = parser.parse_args()
+    # Keep benchmarks off the bot's candle archive; the archive benchmark uses a temporary one.
+    trading_strategy.STORE.archive = None
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
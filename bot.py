@@ -2,13 +2,20 @@ import telegram
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler
 import discord
-from discord.ext import tasks
 import asyncio
+import io
 import json
 import logging
+from collections import OrderedDict
 
-from trading_strategy import fetch_data, generate_signal, place_order, get_all_signals, PAIRS, MAJOR_CURRENCIES
-from graphics import generate_chart, generate_comparison_chart
+from trading_strategy import fetch_data, generate_signal, place_order, PAIRS, MAJOR_CURRENCIES, SIGNAL_CACHE, CORRELATIONS
+import execution
+from execution import render_charts, render_comparison
+from delivery import FanOut, SendQueue, SEND_LIMITS, SUBSCRIPTIONS, parse_targets
+from metrics import STAGES, TIMINGS, serve_metrics
+from orders import ORDERS
+from price_stream import PriceStream
+from scheduler import CandleScheduler
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,6 +35,19 @@ discord_client = discord.Client(intents=intents)
 pairs = PAIRS
 granularity = config["granularity"]
 
+async def timed_send(platform, send):
+    # Time a chat API call (message, photo or edit) as the "send" stage.
+    with TIMINGS.time("send", platform=platform):
+        return await send
+
+def strength_caption():
+    # Strongest to weakest currency over the correlation window, for the comparison chart.
+    snapshot = CORRELATIONS.snapshot(granularity)
+    ranked = sorted(((s, c) for c, s in zip(snapshot["currencies"], snapshot["strength"]) if s == s), reverse=True)
+    if not ranked:
+        return "Currency strength: not enough bars yet."
+    return "Currency strength: " + ", ".join(f"{c} {s:+.2f}%" for s, c in ranked)
+
 async def start(update, context):
     keyboard = [
         [InlineKeyboardButton("EUR", callback_data="eur_menu"), InlineKeyboardButton("USD", callback_data="usd_menu")],
@@ -70,42 +90,43 @@ async def button(update, context):
         
         base_currency = query.data.split("_")[0].upper()
         filtered_pairs = [pair for pair in pairs if pair.startswith(base_currency + "_")]
-        signals = get_all_signals(filtered_pairs, granularity)
+        signals = await execution.get_all_signals(filtered_pairs, granularity)
         
         if query.data.endswith("_predictions"):
             message = f"{base_currency} Pairs Predictions:\n\n"
             for pair, data in signals.items():
                 message += f"{pair}:\n"
                 message += f"  Entry: {data['df']['close'].iloc[-1]:.5f}\n"
+                # Higher timeframes come from the same base candles, so this view needs no extra requests.
+                message += f"  Trend: {granularity} {data['bias']}"
+                message += "".join(f" | {tf} {view['bias']} ({view['signal']})" for tf, view in data["timeframes"].items()) + "\n"
                 message += f"  SL: {data['sl']:.5f}\n"
                 message += f"  TP: {data['tp']:.5f}\n"
                 message += f"  {data['analysis']}\n"
                 message += f"  Rec: {data['recommendation']} ({data['confidence']*100:.0f}%)\n\n"
             keyboard = [[InlineKeyboardButton("Back", callback_data=f"back_to_{base_currency.lower()}")]]
-            await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+            await timed_send("telegram", query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard)))
         
         elif query.data.endswith("_charts"):
+            charts = await render_charts(signals, granularity)
             for pair, data in signals.items():
-                if not data["df"].empty:
-                    generate_chart(data["df"], pair)
+                chart = charts[pair]
+                if chart is not None:
                     caption = f"{pair}: {data['recommendation']} ({data['confidence']*100:.0f}%)"
-                    with open(f"chart_{pair.replace('_', '')}.png", "rb") as photo:
-                        await query.message.reply_photo(photo=photo, caption=caption)
+                    await timed_send("telegram", query.message.reply_photo(photo=chart, caption=caption))
             keyboard = [[InlineKeyboardButton("Back", callback_data=f"back_to_{base_currency.lower()}")]]
             await query.edit_message_text(f"Charts for {base_currency} pairs sent!", reply_markup=InlineKeyboardMarkup(keyboard))
         
         elif query.data.endswith("_compare"):
-            generate_comparison_chart(signals)
-            with open("comparison_chart.png", "rb") as photo:
-                await query.message.reply_photo(photo=photo)
+            comparison = await render_comparison(signals, granularity)
+            await timed_send("telegram", query.message.reply_photo(photo=comparison, caption=strength_caption()))
             keyboard = [[InlineKeyboardButton("Back", callback_data=f"back_to_{base_currency.lower()}")]]
             await query.edit_message_text(f"Comparison for {base_currency} pairs!", reply_markup=InlineKeyboardMarkup(keyboard))
         
         elif query.data == "compare_all":
-            signals = get_all_signals(pairs, granularity)
-            generate_comparison_chart(signals)
-            with open("comparison_chart.png", "rb") as photo:
-                await query.message.reply_photo(photo=photo)
+            signals = await execution.get_all_signals(pairs, granularity)
+            comparison = await render_comparison(signals, granularity)
+            await timed_send("telegram", query.message.reply_photo(photo=comparison, caption=strength_caption()))
             keyboard = [[InlineKeyboardButton("Back", callback_data="back_to_main")]]
             await query.edit_message_text("Comparison chart sent!", reply_markup=InlineKeyboardMarkup(keyboard))
         
@@ -114,60 +135,212 @@ async def button(update, context):
         await query.edit_message_text("Error occurred. Try again.")
 
 async def manual_update(update, context):
-    signals = get_all_signals(pairs, granularity)
+    signals = await execution.get_all_signals(pairs, granularity)
     message = "Manual Update:\n\n"
     for pair, data in signals.items():
         message += f"{pair}: {data['signal']} ({data['strength']:.2f}%)\n"
         message += f"  SL: {data['sl']:.5f}, TP: {data['tp']:.5f}\n"
         message += f"  {data['analysis']}\n"
         message += f"  Rec: {data['recommendation']} ({data['confidence']*100:.0f}%)\n\n"
-    await update.message.reply_text(message)
-    generate_comparison_chart(signals)
-    with open("comparison_chart.png", "rb") as photo:
-        await update.message.reply_photo(photo=photo)
+    await timed_send("telegram", update.message.reply_text(message))
+    comparison = await render_comparison(signals, granularity)
+    await timed_send("telegram", update.message.reply_photo(photo=comparison, caption=strength_caption()))
+
+def stats_message():
+    lines = ["Stage timings in ms (p50 / p99 / max, count):"]
+    snapshots = TIMINGS.snapshot()
+    for stage in sorted(snapshots, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+        s = snapshots[stage]
+        lines.append(f"  {stage}: {s['p50_ms']:.1f} / {s['p99_ms']:.1f} / {s['max_ms']:.1f} ({s['count']})")
+    fetches = sorted(TIMINGS.snapshot("fetch").items(), key=lambda item: item[1]["p99_ms"], reverse=True)
+    if fetches:
+        lines.append("  slowest fetches (p99): " + ", ".join(f"{dict(labels)['pair']} {s['p99_ms']:.0f}" for labels, s in fetches[:3]))
+    lines.append(f"Signal cache: {SIGNAL_CACHE.stats()}")
+    lines.append(f"Chart cache: {execution.CHARTS.stats()}")
+    lines.append(f"Scheduler: {scheduler.closes} closes, {scheduler.evaluations} evaluations, {scheduler.published} published")
+    lines.append(f"Delivery: {len(SUBSCRIPTIONS)} subscribers, {fanout.deliveries} messages queued; " + ", ".join(
+        f"{platform} {queue.sent} sent / {queue.stats()['queued']} waiting / {queue.failed} failed"
+        for platform, queue in queues.items()))
+    if ORDERS.running:
+        orders = ORDERS.stats()
+        lines.append(f"Orders: {orders['placed']} placed, {orders['recovered']} recovered, {orders['failed']} failed, "
+                     f"{orders['queued']} queued")
+    return "\n".join(lines)
+
+async def stats(update, context):
+    await update.message.reply_text(stats_message())
+
+async def profile(update, context):
+    # Opt-in: runs one full update cycle inline under cProfile and replies with the report.
+    if not config.get("profiling"):
+        await update.message.reply_text("Profiling is off. Set \"profiling\": true in config.json to enable /profile.")
+        return
+    await update.message.reply_text("Profiling one update cycle...")
+    report = await execution.run_io(execution.profile_cycle, pairs, granularity)
+    logger.info(f"Profile of one update cycle:\n{report}")
+    await update.message.reply_document(document=io.BytesIO(report.encode()), filename="profile.txt")
+
+def discord_message(pair, data):
+    message = f"**{pair}: {data['signal']} ({data['strength']:.2f}%)**\n"
+    message += f"SL: {data['sl']:.5f}, TP: {data['tp']:.5f}\n"
+    message += f"{data['analysis']}\n"
+    message += f"Rec: {data['recommendation']} ({data['confidence']*100:.0f}%)\n"
+    return message
+
+def signal_message(platform, pair, data):
+    message = discord_message(pair, data)
+    return message if platform == "discord" else message.replace("**", "")
 
-@tasks.loop(minutes=15)
-async def post_update():
+# Telegram file_id of each chart already uploaded, keyed like the chart cache, so the same chart goes
+# to every further subscriber by reference instead of being uploaded again.
+telegram_file_ids = OrderedDict()
+
+async def send_telegram(chat, message):
+    if message["image"] is None:
+        await timed_send("telegram", application.bot.send_message(chat, message["text"]))
+        return
+    key = message["image_key"]
+    photo = telegram_file_ids.get(key, message["image"])
+    sent = await timed_send("telegram", application.bot.send_photo(chat, photo=photo, caption=message["text"][:1024]))
+    if key is not None and key not in telegram_file_ids:
+        telegram_file_ids[key] = sent.photo[-1].file_id
+        while len(telegram_file_ids) > 1024:
+            telegram_file_ids.popitem(last=False)
+
+async def send_discord(chat, message):
+    channel = discord_client.get_channel(chat) or await discord_client.fetch_channel(chat)
+    file = discord.File(io.BytesIO(message["image"]), filename=message["filename"]) if message["image"] else None
+    await timed_send("discord", channel.send(message["text"], file=file))
+
+async def comparison_message():
+    # Pairs whose bar has not closed are still cached until their own close.
+    signals = await execution.get_all_signals(pairs, granularity)
+    return await render_comparison(signals, granularity), f"Comparison\n{strength_caption()}"
+
+queues = {platform: SendQueue(send, *SEND_LIMITS[platform])
+          for platform, send in (("telegram", send_telegram), ("discord", send_discord))}
+fanout = FanOut(SUBSCRIPTIONS, queues, lambda changed: render_charts(changed, granularity), signal_message, comparison_message)
+
+def subscription_command(platform, chat, command, words, prefix="/"):
+    usage = (f"Usage: {prefix}subscribe EUR_USD JPY 70 compare (pairs, currencies or all, a minimum "
+             f"confidence in %, and the comparison chart at each close). {prefix}unsubscribe takes the same "
+             f"pairs, or nothing to stop everything.")
     try:
-        channel = discord_client.get_channel(int(config["discord_channel_id"]))
-        signals = get_all_signals(pairs, granularity)
-        
-        for pair, data in signals.items():
-            if not data["df"].empty:
-                generate_chart(data["df"], pair)
-                message = f"**{pair}: {data['signal']} ({data['strength']:.2f}%)**\n"
-                message += f"SL: {data['sl']:.5f}, TP: {data['tp']:.5f}\n"
-                message += f"{data['analysis']}\n"
-                message += f"Rec: {data['recommendation']} ({data['confidence']*100:.0f}%)\n"
-                with open(f"chart_{pair.replace('_', '')}.png", "rb") as photo:
-                    await channel.send(message, file=discord.File(photo))
-        
-        generate_comparison_chart(signals)
-        with open("comparison_chart.png", "rb") as photo:
-            await channel.send("**Trend Comparison**", file=discord.File(photo))
+        chosen, confidence, comparison = parse_targets(words, pairs)
+    except ValueError as e:
+        return f"{e}. {usage}"
+    if command == "subscribe":
+        if chosen is None and confidence is None and comparison is None:
+            return usage
+        entry = SUBSCRIPTIONS.subscribe(platform, chat, chosen, confidence, comparison)
+    elif command == "unsubscribe":
+        if confidence is not None:
+            # Otherwise "/unsubscribe 70" would read as no pairs and stop everything.
+            return f"{prefix}unsubscribe takes no confidence; set it with {prefix}subscribe. {usage}"
+        entry = SUBSCRIPTIONS.unsubscribe(platform, chat, (chosen or []) if chosen or comparison else None)
+        if comparison and entry is not None:
+            entry = SUBSCRIPTIONS.subscribe(platform, chat, comparison=False)
+    else:
+        entry = SUBSCRIPTIONS.get(platform, chat)
+    if entry is None:
+        return f"No subscriptions. {usage}"
+    return (f"Subscribed to {', '.join(entry['pairs']) or 'no pairs'} at {entry['min_confidence']*100:.0f}%+ confidence"
+            f"{', with the comparison chart' if entry['comparison'] else ''}. Only signals that change are sent.")
+
+async def subscribe(update, context):
+    await update.message.reply_text(subscription_command("telegram", update.effective_chat.id, "subscribe", context.args))
+
+async def unsubscribe(update, context):
+    await update.message.reply_text(subscription_command("telegram", update.effective_chat.id, "unsubscribe", context.args))
+
+async def subscriptions(update, context):
+    await update.message.reply_text(subscription_command("telegram", update.effective_chat.id, "subscriptions", []))
+
+async def post_stream_signal(pair, data):
+    # Stream closes share the scheduler's change detection: an unchanged signal is not sent again,
+    # and the scheduler's own evaluation of the same close a moment later finds nothing new.
+    try:
+        changed = scheduler.changes({pair: data})
+        if changed:
+            await fanout.publish(changed, comparison=False)
     except Exception as e:
-        logger.error(f"Discord update error: {e}")
+        logger.error(f"Stream signal error: {e}")
+
+def start_price_stream(loop):
+    def on_signal(pair, data):
+        asyncio.run_coroutine_threadsafe(post_stream_signal(pair, data), loop)
+        if data["signal"] != "HOLD" and ORDERS.running:
+            asyncio.run_coroutine_threadsafe(ORDERS.submit(pair, data, granularity), loop)
+    return PriceStream(pairs, granularity, on_signal=on_signal).start()
+
+async def post_update(changed):
+    # Called by the scheduler after a candle close with only the pairs whose signal changed; each
+    # subscriber gets the ones it follows through its platform's send queue.
+    try:
+        queued = await fanout.publish(changed)
+        logger.info(f"Close: {len(changed)} changed, {queued} messages queued for {len(SUBSCRIPTIONS)} subscribers. "
+                    f"Signal cache: {SIGNAL_CACHE.stats()}, chart cache: {execution.CHARTS.stats()}")
+    except Exception as e:
+        logger.error(f"Update fan-out error: {e}")
+
+scheduler = CandleScheduler(pairs, granularity, execution.get_all_signals, post_update)
 
 @discord_client.event
 async def on_ready():
     print(f"Logged in as {discord_client.user}")
-    if not post_update.is_running():
-        post_update.start()
+    if not scheduler.running:
+        scheduler.start()
+
+@discord_client.event
+async def on_message(message):
+    words = message.content.split()
+    if message.author == discord_client.user or not words or words[0] not in ("!subscribe", "!unsubscribe", "!subscriptions"):
+        return
+    await message.channel.send(subscription_command("discord", message.channel.id, words[0][1:], words[1:], prefix="!"))
 
 application.add_handler(CommandHandler("start", start))
 application.add_handler(CommandHandler("update", manual_update))
+application.add_handler(CommandHandler("stats", stats))
+application.add_handler(CommandHandler("profile", profile))
+application.add_handler(CommandHandler("subscribe", subscribe))
+application.add_handler(CommandHandler("unsubscribe", unsubscribe))
+application.add_handler(CommandHandler("subscriptions", subscriptions))
 application.add_handler(CallbackQueryHandler(button))
 
 async def main():
+    execution.start()
     await application.initialize()
     await application.start()
     telegram_task = asyncio.create_task(application.updater.start_polling())
     discord_task = discord_client.start(config["discord_token"])
+    if config.get("auto_trade"):
+        ORDERS.start()
+    channel = str(config.get("discord_channel_id", ""))
+    if channel.isdigit():
+        # The configured channel starts with every pair and the comparison chart; an unsubscribe sticks.
+        SUBSCRIPTIONS.seed("discord", int(channel), pairs, comparison=True)
+    for queue in queues.values():
+        queue.start()
+    price_feed = start_price_stream(asyncio.get_running_loop()) if config.get("price_stream") else None
+    metrics_server = serve_metrics(int(config["metrics_port"]), config.get("metrics_host", "127.0.0.1")) if config.get("metrics_port") else None
     try:
         await asyncio.gather(telegram_task, discord_task)
     except Exception as e:
         logger.error(f"Main error: {e}")
     finally:
+        if price_feed is not None:
+            price_feed.stop()
+            logger.info(f"Price stream latency: {price_feed.latency_stats()}")
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        await scheduler.stop()
+        for queue in queues.values():
+            await queue.stop()
+        logger.info(f"Delivery: {fanout.stats()}")
+        logger.info(f"Scheduler: {scheduler.closes} closes, {scheduler.evaluations} evaluations, {scheduler.published} published")
+        if ORDERS.running:
+            await ORDERS.stop()
+            logger.info(f"Orders: {ORDERS.stats()}")
         if application.updater.running:
             await application.updater.stop()
         await application.stop()
@@ -175,6 +348,7 @@ async def main():
         if not discord_client.is_closed():
             await discord_client.close()
             await asyncio.sleep(1)
+        execution.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
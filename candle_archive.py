@@ -0,0 +1,83 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from oanda import config
+
+CANDLE_DIR = config.get("candle_dir", "candles")
+COLUMNS = {"time": np.dtype("<i8"), "open": np.dtype("<f8"), "high": np.dtype("<f8"),
+           "low": np.dtype("<f8"), "close": np.dtype("<f8")}
+
+class CandleArchive:
+    # Complete candles per (pair, granularity), one append-only binary file per column holding
+    # epoch seconds or float64 prices. Reads memory-map the files and copy out only the rows asked
+    # for, so loading the latest window of a multi-year history touches a few pages.
+    def __init__(self, directory=None):
+        self.directory = directory or CANDLE_DIR
+        self._lock = threading.Lock()
+
+    def path(self, pair, granularity, column=None):
+        folder = os.path.join(self.directory, f"{pair}_{granularity}")
+        return folder if column is None else os.path.join(folder, f"{column}.bin")
+
+    def length(self, pair, granularity):
+        # A write interrupted between columns leaves them uneven; the shortest one is the valid length.
+        sizes = []
+        for column, dtype in COLUMNS.items():
+            path = self.path(pair, granularity, column)
+            sizes.append(os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0)
+        return min(sizes)
+
+    def _column(self, pair, granularity, column, length):
+        if not length:
+            return np.empty(0, dtype=COLUMNS[column])
+        return np.memmap(self.path(pair, granularity, column), dtype=COLUMNS[column], mode="r", shape=(length,))
+
+    def times(self, pair, granularity):
+        return self._column(pair, granularity, "time", self.length(pair, granularity))
+
+    def last_time(self, pair, granularity):
+        times = self.times(pair, granularity)
+        return pd.Timestamp(int(times[-1]), unit="s", tz="UTC") if len(times) else None
+
+    def columns(self, pair, granularity, start=None, end=None, bars=None):
+        # Row range [start, end] by time, limited to the latest `bars` rows, as memory-mapped slices.
+        length = self.length(pair, granularity)
+        times = self._column(pair, granularity, "time", length)
+        first = int(np.searchsorted(times, _seconds(start))) if start is not None else 0
+        last = int(np.searchsorted(times, _seconds(end), side="right")) if end is not None else length
+        if bars is not None:
+            first = max(first, last - bars)
+        return {column: self._column(pair, granularity, column, length)[first:last] for column in COLUMNS}
+
+    def read(self, pair, granularity, start=None, end=None, bars=None):
+        data = self.columns(pair, granularity, start, end, bars)
+        if not len(data["time"]):
+            return pd.DataFrame()
+        index = pd.DatetimeIndex(pd.to_datetime(np.array(data["time"]), unit="s", utc=True), name="time")
+        return pd.DataFrame({column: np.array(data[column]) for column in ("open", "high", "low", "close")}, index=index)
+
+    def append(self, pair, granularity, df):
+        # Only rows newer than the archived tail are written, so overlapping pages can be appended as-is.
+        if df.empty:
+            return 0
+        with self._lock:
+            length = self.length(pair, granularity)
+            times = self._column(pair, granularity, "time", length)
+            new = df.index.as_unit("s").asi8
+            keep = new > times[-1] if length else np.ones(len(new), dtype=bool)
+            if not keep.any():
+                return 0
+            os.makedirs(self.path(pair, granularity), exist_ok=True)
+            values = {"time": new[keep]}
+            values.update({column: df[column].to_numpy(dtype=float)[keep] for column in ("open", "high", "low", "close")})
+            for column, dtype in COLUMNS.items():
+                with open(self.path(pair, granularity, column), "ab") as f:
+                    f.truncate(length * dtype.itemsize)
+                    f.write(np.ascontiguousarray(values[column], dtype=dtype).tobytes())
+            return int(keep.sum())
+
+def _seconds(when):
+    return int(pd.Timestamp(when).timestamp())
@@ -0,0 +1,155 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from oanda import api_get
+from metrics import TIMINGS
+
+MAX_BARS = 500
+GAP_PAGE = 5000
+
+def parse_candles(candles):
+    # Bulk decode into NumPy arrays: numpy parses the price strings and the RFC3339 timestamps
+    # (with the trailing "Z" dropped) in C instead of one dict, four float() calls and a
+    # pd.to_datetime per candle. Bid/ask closes from price="MBA" are kept as bid, ask and spread.
+    # They end at the store: indicator frames, the panel and the archive carry OHLC only, and bars
+    # warmed from the archive or built from the price stream have NaN there.
+    if not candles:
+        return pd.DataFrame(columns=["open", "high", "low", "close"]), None
+    times = np.array([candle["time"].rstrip("Z") for candle in candles], dtype="datetime64[ns]")
+    index = pd.DatetimeIndex(times, name="time").tz_localize("UTC")
+    if "bid" in candles[0] and "ask" in candles[0]:
+        prices = np.array([(mid["o"], mid["h"], mid["l"], mid["c"], bid["c"], ask["c"])
+                           for mid, bid, ask in ((c["mid"], c["bid"], c["ask"]) for c in candles)], dtype=np.float64)
+    else:
+        prices = np.array([(mid["o"], mid["h"], mid["l"], mid["c"]) for mid in (c["mid"] for c in candles)], dtype=np.float64)
+    columns = {"open": prices[:, 0], "high": prices[:, 1], "low": prices[:, 2], "close": prices[:, 3]}
+    if prices.shape[1] > 4:
+        columns.update(bid=prices[:, 4], ask=prices[:, 5], spread=prices[:, 5] - prices[:, 4])
+    complete = np.fromiter((candle.get("complete", True) for candle in candles), dtype=bool, count=len(candles))
+    last_complete = index[np.flatnonzero(complete)[-1]] if complete.any() else None
+    return pd.DataFrame(columns, index=index), last_complete
+
+def fetch_history(pair, granularity, bars, since=None):
+    # Page backwards from the latest complete candle, stopping once `since` is reached; OANDA caps
+    # a single request at 5000 candles (GAP_PAGE).
+    frames, to = [], None
+    while bars > 0:
+        params = {"count": min(bars, GAP_PAGE), "granularity": granularity, "price": "MBA"}
+        if to is not None:
+            params["to"] = to.isoformat()
+        with TIMINGS.time("fetch", pair=pair):
+            data = api_get(f"/instruments/{pair}/candles", params)
+        candles = [c for c in data.get("candles", []) if c.get("complete", True)]
+        if not candles:
+            break
+        with TIMINGS.time("parse"):
+            df, _ = parse_candles(candles)
+        frames.insert(0, df[df.index < to] if to is not None else df)
+        bars -= len(frames[0])
+        if len(candles) < params["count"] or frames[0].empty or (since is not None and df.index[0] <= since):
+            break
+        to = df.index[0]
+    return pd.concat(frames) if frames else pd.DataFrame()
+
+class CandleStore:
+    # Keeps a rolling window per (pair, granularity) and only asks OANDA for bars from the last
+    # complete one onwards; the still-forming bar is replaced on every refresh. With an archive,
+    # complete bars are persisted and a cold start warms from disk, fetching only the gap.
+    def __init__(self, max_bars=MAX_BARS, archive=None):
+        self.max_bars = max_bars
+        self.archive = archive
+        self._frames = {}
+        self._last_complete = {}
+        # Last complete bar that came from OANDA (REST or archive), where the next incremental request
+        # starts; stream-built bars after it are replaced by OANDA's own.
+        self._fetched = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, pair, granularity, refresh=True):
+        key = (pair, granularity)
+        with self._key_lock(key):
+            if refresh or key not in self._frames:
+                try:
+                    self._refresh(key)
+                except Exception as e:
+                    print(f"Error fetching {pair}: {e}")
+            df = self._frames.get(key)
+            if df is None:
+                return pd.DataFrame()
+            df = df.copy()
+            df.attrs["last_complete"] = self._last_complete.get(key)
+            return df
+
+    def apply_bar(self, pair, granularity, time, open_, high, low, close):
+        # Record a bar closed outside the REST path (e.g. built from the pricing stream) as complete.
+        # It is kept in memory only: the archive holds OANDA's own candles, and the next REST refresh
+        # fetches from the last of those, replacing this bar.
+        key = (pair, granularity)
+        with self._key_lock(key):
+            bar = pd.DataFrame({"open": [open_], "high": [high], "low": [low], "close": [close]},
+                               index=pd.DatetimeIndex([time], name="time"))
+            frame = self._frames.get(key)
+            if frame is not None:
+                bar = pd.concat([frame[frame.index < time], bar])
+            self._frames[key] = bar.iloc[-self.max_bars:]
+            self._last_complete[key] = time
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._last_complete.clear()
+            self._fetched.clear()
+
+    def _request(self, pair, granularity, since=None, count=None):
+        params = {"count": count or self.max_bars, "granularity": granularity, "price": "MBA"}
+        if since is not None:
+            params["from"] = since.isoformat()
+        with TIMINGS.time("fetch", pair=pair):
+            data = api_get(f"/instruments/{pair}/candles", params)
+        return data.get("candles") or []
+
+    def _warm(self, key):
+        df = self.archive.read(*key, bars=self.max_bars)
+        if not df.empty:
+            self._frames[key] = df
+            self._last_complete[key] = self._fetched[key] = df.index[-1]
+
+    def _refresh(self, key):
+        pair, granularity = key
+        if key not in self._frames and self.archive is not None:
+            self._warm(key)
+        since = self._fetched.get(key)
+        candles = self._request(pair, granularity, since)
+        if since is not None and len(candles) >= self.max_bars:
+            if self.archive is None:
+                # The gap is wider than the window, so the incremental page is not the latest one.
+                since = None
+                candles = self._request(pair, granularity)
+            else:
+                # Page forward through the gap in maximum-size pages so the archive stays contiguous.
+                page, count = candles, self.max_bars
+                while len(page) >= count:
+                    count = GAP_PAGE
+                    page = self._request(pair, granularity, pd.Timestamp(page[-1]["time"]), count)
+                    candles = candles + page[1:]
+        if not candles:
+            if key not in self._frames:
+                print(f"No candle data for {pair}")
+            return
+        with TIMINGS.time("parse"):
+            new, last_complete = parse_candles(candles)
+        if self.archive is not None and last_complete is not None:
+            self.archive.append(pair, granularity, new[new.index <= last_complete])
+        frame = self._frames.get(key)
+        if since is not None and frame is not None:
+            new = pd.concat([frame[frame.index < new.index[0]], new])
+        self._frames[key] = new.iloc[-self.max_bars:]
+        if last_complete is not None:
+            self._last_complete[key] = self._fetched[key] = last_complete
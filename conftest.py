@@ -0,0 +1,17 @@
+import pytest
+
+import oanda
+import trading_strategy
+from stubs import StubOanda
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # A stub OANDA server for the test, with the shared store, caches and archive kept out of it.
+    with StubOanda() as server:
+        monkeypatch.setattr(oanda, "BASE_URL", server.base_url)
+        monkeypatch.setattr(trading_strategy.STORE, "archive", None)
+        trading_strategy.STORE.clear()
+        trading_strategy.INDICATORS.clear()
+        trading_strategy.SIGNAL_CACHE.clear()
+        yield server
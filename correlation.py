@@ -0,0 +1,199 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from oanda import config
+from signal_cache import GRANULARITY_SECONDS
+from timeframes import frame_arrays
+
+# Complete bars of log returns behind each correlation and strength score, and how many of them a
+# pair (or both pairs of a correlation) must have before it is reported.
+CORRELATION_WINDOW = int(config.get("correlation_window", 120))
+MIN_BARS = int(config.get("correlation_min_bars", CORRELATION_WINDOW // 2))
+
+def moments(x, valid):
+    # Pairwise-complete sums over rows of zero-filled returns x and their 0/1 validity mask: [i, j]
+    # holds the row count, the sum and the sum of squares of i over rows where j is also valid, and
+    # the cross product of i and j.
+    return np.stack([valid.T @ valid, x.T @ valid, (x * x).T @ valid, x.T @ x])
+
+def correlation(m, min_bars=MIN_BARS):
+    # Pearson correlation over the rows both pairs have, as pandas' DataFrame.corr computes it.
+    n, sx, sxx, sxy = m
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = n * sxx - sx * sx
+        corr = (n * sxy - sx * sx.T) / np.sqrt(var * var.T)
+    corr[n < min_bars] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+class CorrelationEngine:
+    # Rolling correlations of log returns across all pairs and per-currency strength, for one
+    # granularity. A complete bar becomes a row once every reporting pair has closed it; each row
+    # adds its outer products to the pairwise sums and the row leaving the window subtracts its own,
+    # so a close costs O(pairs^2) instead of O(window * pairs^2). The sums are rebuilt from the
+    # window once per `window` rows so rounding cannot accumulate.
+    def __init__(self, pairs, granularity, currencies, window=CORRELATION_WINDOW, min_bars=MIN_BARS):
+        self.pairs = list(pairs)
+        self.granularity = granularity
+        self.window = window
+        self.min_bars = min_bars
+        self._column = {pair: i for i, pair in enumerate(self.pairs)}
+        # Each pair of two listed currencies counts +1 for its base and -1 for its quote.
+        legs = [pair.split("_") for pair in self.pairs]
+        self.currencies = [c for c in currencies if any(c in pair for pair in legs)]
+        self.legs = np.zeros((len(self.pairs), len(self.currencies)))
+        for i, (base, quote) in enumerate(legs):
+            if base in self.currencies and quote in self.currencies:
+                self.legs[i, self.currencies.index(base)] = 1.0
+                self.legs[i, self.currencies.index(quote)] = -1.0
+        self.times = np.empty(0, dtype=np.int64)
+        self.x = np.empty((0, len(self.pairs)))
+        self.valid = np.empty((0, len(self.pairs)))
+        self.last = np.full(len(self.pairs), np.nan)
+        self.moments = np.zeros((4, len(self.pairs), len(self.pairs)))
+        self.rows = 0
+        self.rebuilds = 0
+        self._since_rebuild = 0
+        self._stale = False
+        self._bars = {}
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    @property
+    def committed(self):
+        return int(self.times[-1]) if len(self.times) else None
+
+    def update(self, frames):
+        # frames are store frames; only bars up to df.attrs["last_complete"] are used.
+        with self._lock:
+            for pair, df in frames.items():
+                if pair in self._column and not df.empty:
+                    self._ingest(pair, df)
+            return self._commit()
+
+    def _ingest(self, pair, df):
+        seconds, values = frame_arrays(df, ["close"])
+        if "last_complete" not in df.attrs:
+            complete = len(seconds)
+        elif df.attrs["last_complete"] is None:
+            return
+        else:
+            complete = int(np.searchsorted(seconds, pd.Timestamp(df.attrs["last_complete"]).timestamp(), side="right"))
+        if not complete:
+            return
+        j = self._column[pair]
+        start = 0
+        if len(self.times):
+            if self._seen.get(pair, -1) < self.committed:
+                # A pair reporting for the first time, or again after being left out, fills in the
+                # rows already in the window.
+                pos = np.searchsorted(self.times, seconds[1:complete])
+                hit = pos < len(self.times)
+                hit[hit] = self.times[pos[hit]] == seconds[1:complete][hit]
+                self.x[pos[hit], j] = np.diff(np.log(values[:complete]))[hit]
+                self.valid[pos[hit], j] = 1.0
+                self._stale = True
+            # Only bars after the committed row are new; the last one before it is the base of the
+            # pair's next return.
+            start = max(int(np.searchsorted(seconds, self.committed, side="right")) - 1, 0)
+        seconds, closes = seconds[start:complete], np.log(values[start:complete])
+        if len(self.times) and seconds[0] <= self.committed:
+            self.last[j] = closes[0]
+        self._seen[pair] = int(seconds[-1])
+        self._bars[pair] = (seconds, closes)
+
+    def _commit(self):
+        if not self._seen:
+            return 0
+        # Pairs that stopped reporting for a whole window (weekend, failing fetches) no longer hold
+        # the others back; their entries in the rows committed meanwhile stay empty.
+        newest = max(self._seen.values())
+        watermark = min(t for t in self._seen.values() if newest - t < self.window * GRANULARITY_SECONDS[self.granularity])
+        low = self.committed if len(self.times) else np.iinfo(np.int64).min
+        if watermark <= low:
+            if self._stale:
+                self._rebuild()
+            return 0
+        times = np.unique(np.concatenate([seconds[(seconds > low) & (seconds <= watermark)]
+                                          for seconds, _ in self._bars.values()]))
+        if not len(times):
+            if self._stale:
+                self._rebuild()
+            return 0
+        closes = np.full((len(times) + 1, len(self.pairs)), np.nan)
+        closes[0] = self.last
+        for pair, (seconds, values) in self._bars.items():
+            j = self._column[pair]
+            new = (seconds > low) & (seconds <= watermark)
+            closes[1 + np.searchsorted(times, seconds[new]), j] = values[new]
+            later = seconds > watermark
+            self._bars[pair] = (seconds[later], values[later])
+        # Each pair's return runs from its own previous close, across bars it did not print.
+        rows = np.where(np.isnan(closes), 0, np.arange(len(closes))[:, None])
+        filled = closes[np.maximum.accumulate(rows, axis=0), np.arange(len(self.pairs))]
+        returns = closes[1:] - filled[:-1]
+        self.last = filled[-1]
+        valid = (~np.isnan(returns)).astype(float)
+        x = np.where(valid > 0, returns, 0.0)
+        self._append(times, x, valid)
+        return len(times)
+
+    def _append(self, times, x, valid):
+        drop = max(len(self.times) + len(times) - self.window, 0)
+        incremental = not self._stale and self._since_rebuild + len(times) < self.window
+        if incremental:
+            self.moments += moments(x, valid) - moments(self.x[:drop], self.valid[:drop])
+            self._since_rebuild += len(times)
+        self.times = np.concatenate([self.times, times])[drop:]
+        self.x = np.concatenate([self.x, x])[drop:]
+        self.valid = np.concatenate([self.valid, valid])[drop:]
+        self.rows += len(times)
+        if not incremental:
+            self._rebuild()
+
+    def _rebuild(self):
+        self.moments = moments(self.x, self.valid)
+        self.rebuilds += 1
+        self._since_rebuild = 0
+        self._stale = False
+
+    def snapshot(self):
+        with self._lock:
+            m = self.moments.copy()
+            time = self.committed
+            bars = len(self.times)
+        # Strength: each pair's move over the window (the sum of its log returns, in %), credited to
+        # its base and debited from its quote, averaged over the pairs each currency is in.
+        count, move = np.diagonal(m[0]), np.diagonal(m[1]) * 100
+        ok = count >= self.min_bars
+        legs = self.legs[ok]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            strength = legs.T @ move[ok] / np.abs(legs).sum(axis=0)
+        return {"time": None if time is None else pd.Timestamp(time, unit="s", tz="UTC"), "bars": bars,
+                "pairs": self.pairs, "correlation": correlation(m, self.min_bars),
+                "currencies": self.currencies, "strength": strength}
+
+class CorrelationEngines:
+    def __init__(self, pairs, currencies, window=CORRELATION_WINDOW):
+        self.pairs = list(pairs)
+        self.currencies = list(currencies)
+        self.window = window
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def engine(self, granularity):
+        with self._lock:
+            if granularity not in self._engines:
+                self._engines[granularity] = CorrelationEngine(self.pairs, granularity, self.currencies, self.window)
+            return self._engines[granularity]
+
+    def update(self, granularity, frames):
+        return self.engine(granularity).update(frames)
+
+    def snapshot(self, granularity):
+        return self.engine(granularity).snapshot()
+
+    def clear(self):
+        with self._lock:
+            self._engines.clear()
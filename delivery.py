@@ -0,0 +1,356 @@
+import asyncio
+import json
+import math
+import os
+import threading
+from collections import deque
+from time import monotonic
+
+from oanda import config
+from metrics import Histogram
+
+SUBSCRIPTIONS_FILE = config.get("subscriptions_file", "subscriptions.json")
+# (messages per second for the whole bot, seconds between messages to one chat): Telegram allows
+# about 30/s overall and one per second per chat; Discord 50/s overall and 5 per 5 s per channel.
+SEND_LIMITS = {"telegram": (30.0, 1.0), "discord": (40.0, 1.0)}
+SEND_LIMITS.update({platform: tuple(limits) for platform, limits in config.get("send_limits", {}).items()})
+SEND_RETRIES = 3
+# Waiting messages kept per chat; past this the oldest are dropped.
+CHAT_BACKLOG = 50
+
+def parse_targets(words, pairs):
+    # "/subscribe EUR_USD JPY 70 compare": pairs, currencies (every pair quoting them on either side)
+    # or "all", a minimum confidence in percent, and "compare" for the comparison chart at each close.
+    selected, confidence, comparison = [], None, None
+    for word in words:
+        word = word.strip().upper()
+        if word == "ALL":
+            selected.extend(pairs)
+        elif word == "COMPARE":
+            comparison = True
+        elif word in pairs:
+            selected.append(word)
+        elif any(word in pair.split("_") for pair in pairs):
+            selected.extend(pair for pair in pairs if word in pair.split("_"))
+        else:
+            try:
+                value = float(word.rstrip("%"))
+            except ValueError:
+                raise ValueError(f"Unknown pair or currency: {word}")
+            if not math.isfinite(value):
+                raise ValueError(f"Confidence must be a number: {word}")
+            confidence = min(max(value, 0.0), 100.0) / 100
+    return list(dict.fromkeys(selected)) or None, confidence, comparison
+
+class Subscriptions:
+    # (platform, chat) -> pairs, minimum confidence and whether the comparison chart is wanted, with
+    # a pair -> subscribers index, so a close's fan-out only visits subscribers of the changed pairs.
+    # Persisted as JSON after every change, with the chats seeded from the config so an unsubscribe
+    # from one of them outlasts a restart.
+    def __init__(self, path=SUBSCRIPTIONS_FILE):
+        self.path = path
+        self._entries = {}
+        self._by_pair = {}
+        self._seeded = set()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading subscriptions: {e}")
+            return
+        # Older files hold only the list of entries.
+        entries = data if isinstance(data, list) else data.get("subscriptions", [])
+        with self._lock:
+            for entry in entries:
+                self._set((entry["platform"], entry["chat"]), entry)
+            if isinstance(data, dict):
+                self._seeded.update((platform, chat) for platform, chat in data.get("seeded", []))
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"subscriptions": [dict(entry, platform=key[0], chat=key[1]) for key, entry in self._entries.items()],
+                    "seeded": [list(key) for key in self._seeded]}
+        try:
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            print(f"Error saving subscriptions: {e}")
+
+    def _set(self, key, entry):
+        old = self._entries.pop(key, None)
+        for pair in old["pairs"] if old else ():
+            self._by_pair[pair].discard(key)
+        if entry is None or not (entry["pairs"] or entry["comparison"]):
+            return None
+        entry = {"pairs": list(entry["pairs"]), "min_confidence": float(entry.get("min_confidence", 0.0)),
+                 "comparison": bool(entry.get("comparison", False))}
+        self._entries[key] = entry
+        for pair in entry["pairs"]:
+            self._by_pair.setdefault(pair, set()).add(key)
+        return entry
+
+    def subscribe(self, platform, chat, pairs=None, min_confidence=None, comparison=None, save=True):
+        key = (platform, chat)
+        with self._lock:
+            entry = dict(self._entries.get(key) or {"pairs": [], "min_confidence": 0.0, "comparison": False})
+            entry["pairs"] = list(dict.fromkeys(entry["pairs"] + list(pairs or ())))
+            if min_confidence is not None:
+                entry["min_confidence"] = min_confidence
+            if comparison is not None:
+                entry["comparison"] = comparison
+            entry = self._set(key, entry)
+        if save:
+            self.save()
+        return entry
+
+    def unsubscribe(self, platform, chat, pairs=None, save=True):
+        # Without pairs the chat is removed entirely, comparison chart included.
+        key = (platform, chat)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if pairs is not None:
+                entry = dict(entry, pairs=[pair for pair in entry["pairs"] if pair not in pairs])
+            entry = self._set(key, entry if pairs is not None else None)
+        if save:
+            self.save()
+        return entry
+
+    def seed(self, platform, chat, pairs=None, min_confidence=None, comparison=None):
+        # Subscribe a chat once, ever: after that it is the chat's own to change or unsubscribe.
+        key = (platform, chat)
+        with self._lock:
+            if key in self._seeded:
+                return None
+            self._seeded.add(key)
+        return self.subscribe(platform, chat, pairs, min_confidence, comparison)
+
+    def get(self, platform, chat):
+        with self._lock:
+            entry = self._entries.get((platform, chat))
+            return dict(entry) if entry else None
+
+    def matching(self, pair, data):
+        with self._lock:
+            return [key for key in self._by_pair.get(pair, ())
+                    if data["confidence"] >= self._entries[key]["min_confidence"]]
+
+    def comparison(self):
+        with self._lock:
+            return [key for key, entry in self._entries.items() if entry["comparison"]]
+
+    def __len__(self):
+        return len(self._entries)
+
+class RateLimiter:
+    # At most `rate` sends in any one-second window. The times of the last second's sends are kept
+    # and a send waits for the oldest to leave the window, so a second can never carry more than the
+    # rate (a token bucket's burst would add to it) and sleep overshoot does not cost throughput.
+    # A slot is freed `margin` seconds late: the platform times a send on arrival, a moment after
+    # the limiter let it through, and that delay varies from send to send.
+    def __init__(self, rate, period=1.0, margin=0.005):
+        self.limit = max(int(rate), 1)
+        self.period = period + margin
+        self._sent = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = monotonic()
+                while self._sent and self._sent[0] <= now - self.period:
+                    self._sent.popleft()
+                if len(self._sent) < self.limit:
+                    self._sent.append(now)
+                    return
+                await asyncio.sleep(self._sent[0] + self.period - now)
+
+class SendQueue:
+    # Outgoing messages for one platform. Every chat has its own FIFO paced to one message per
+    # `interval` seconds and a rate limiter caps the bot as a whole at `rate` per second, so one busy
+    # chat never delays the others and the bot stays within the platform's global and per-chat
+    # limits. Limits not modelled here (Telegram's 20 per minute in groups, other clients on the same
+    # token) can still be hit: a failed send is retried after the platform's retry_after, if it gave
+    # one. A message for a (chat, key) that is still waiting is replaced by a newer one, so a backlog
+    # never delivers a stale signal.
+    def __init__(self, send, rate, interval, workers=8, retries=SEND_RETRIES, backlog=CHAT_BACKLOG):
+        self.send = send
+        self.rate = rate
+        self.interval = interval
+        self.workers = workers
+        self.retries = retries
+        self.backlog = backlog
+        self.latency = Histogram()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.replaced = 0
+        self.dropped = 0
+        self._chats = {}
+        self._next = {}
+        self._active = set()
+        self._ready = None
+        self._limiter = None
+        self._idle = None
+        self._pending = 0
+        self._tasks = []
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    def start(self):
+        self._ready = asyncio.Queue()
+        self._limiter = RateLimiter(self.rate)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def put(self, chat, key, message):
+        jobs = self._chats.setdefault(chat, deque())
+        for job in jobs:
+            if key is not None and job[0] == key:
+                job[1:3] = monotonic(), message
+                self.replaced += 1
+                return
+        if len(jobs) >= self.backlog:
+            jobs.popleft()
+            self.dropped += 1
+            self._done()
+        jobs.append([key, monotonic(), message, 0])
+        self._pending += 1
+        self._idle.clear()
+        self._schedule(chat)
+
+    async def join(self):
+        await self._idle.wait()
+
+    def _done(self):
+        self._pending -= 1
+        if not self._pending:
+            self._idle.set()
+
+    def _schedule(self, chat):
+        # A chat is in _active from being scheduled until its worker has finished with it, so two
+        # workers never send to the same chat at once.
+        if chat in self._active:
+            return
+        self._active.add(chat)
+        delay = self._next.get(chat, 0.0) - monotonic()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat)
+        else:
+            self._ready.put_nowait(chat)
+
+    async def _worker(self):
+        while True:
+            chat = await self._ready.get()
+            jobs = self._chats.get(chat)
+            job = jobs.popleft() if jobs else None
+            try:
+                if job is not None:
+                    await self._limiter.acquire()
+                    await self._deliver(chat, job, jobs)
+            finally:
+                self._active.discard(chat)
+                if jobs:
+                    self._schedule(chat)
+                elif self._chats.get(chat) is jobs:
+                    self._chats.pop(chat, None)
+
+    async def _deliver(self, chat, job, jobs):
+        key, queued, message, attempts = job
+        try:
+            await self.send(chat, message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if hasattr(retry_after, "total_seconds"):
+                retry_after = retry_after.total_seconds()
+            job[3] = attempts + 1
+            if job[3] > self.retries:
+                self.failed += 1
+                self._done()
+                print(f"Send failed for chat {chat}: {e}")
+                return
+            self.retried += 1
+            self._next[chat] = monotonic() + float(retry_after if retry_after is not None else self.interval * 2 ** attempts)
+            if key is not None and any(waiting[0] == key for waiting in jobs):
+                self.replaced += 1
+                self._done()
+            else:
+                jobs.appendleft(job)
+            return
+        self._next[chat] = monotonic() + self.interval
+        self.sent += 1
+        self.latency.observe(monotonic() - queued)
+        self._done()
+
+    def stats(self):
+        return {"sent": self.sent, "failed": self.failed, "retried": self.retried, "replaced": self.replaced,
+                "dropped": self.dropped, "queued": self._pending, "chats": len(self._chats),
+                "latency": self.latency.snapshot()}
+
+class FanOut:
+    # Delivers one evaluation per candle close to every subscriber of the pairs that changed: each
+    # chart is rendered once (render goes through the chart cache), each message is formatted once
+    # per platform, and a subscriber costs one queue entry.
+    def __init__(self, subscriptions, queues, render, format, compare=None):
+        self.subscriptions = subscriptions
+        self.queues = queues
+        self.render = render
+        self.format = format
+        self.compare = compare
+        self.published = 0
+        self.deliveries = 0
+
+    async def publish(self, changed, comparison=True):
+        targets = {pair: self.subscriptions.matching(pair, data) for pair, data in changed.items()}
+        targets = {pair: keys for pair, keys in targets.items() if keys}
+        charts = await self.render({pair: changed[pair] for pair in targets}) if targets else {}
+        for pair, keys in targets.items():
+            data = changed[pair]
+            image_key = (pair, data["df"].index[-1], "chart")
+            messages = {}
+            for platform, chat in keys:
+                if platform not in self.queues:
+                    continue
+                if platform not in messages:
+                    messages[platform] = {"text": self.format(platform, pair, data), "image": charts.get(pair),
+                                          "image_key": image_key, "filename": f"chart_{pair.replace('_', '')}.png"}
+                self.queues[platform].put(chat, pair, messages[platform])
+                self.deliveries += 1
+            self.published += 1
+        keys = self.subscriptions.comparison() if comparison and self.compare is not None else []
+        if keys:
+            image, text = await self.compare()
+            message = {"text": text, "image": image, "image_key": None, "filename": "comparison_chart.png"}
+            for platform, chat in keys:
+                if platform in self.queues:
+                    self.queues[platform].put(chat, "comparison", message)
+                    self.deliveries += 1
+        return sum(len(keys) for keys in targets.values())
+
+    def stats(self):
+        return {"subscribers": len(self.subscriptions), "published": self.published, "deliveries": self.deliveries,
+                **{platform: queue.stats() for platform, queue in self.queues.items()}}
+
+SUBSCRIPTIONS = Subscriptions()
@@ -0,0 +1,129 @@
+import numpy as np
+
+from candle_store import MAX_BARS
+
+NO_PATTERN, BULLISH_PIN, BEARISH_PIN, BULLISH_ENGULFING, BEARISH_ENGULFING = range(5)
+CONSOLIDATION, BULLISH, BEARISH = range(3)
+PATTERNS = np.array(["No pattern", "Bullish Pin Bar", "Bearish Pin Bar", "Bullish Engulfing", "Bearish Engulfing"])
+STRUCTURES = np.array(["Consolidation", "Bullish (HH, HL)", "Bearish (LH, LL)"])
+
+def _shift(x, n=1):
+    out = np.full(x.shape, np.nan)
+    out[..., n:] = x[..., :-n]
+    return out
+
+def _rolling(x, window, func):
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] >= window:
+        out[..., window - 1:] = func(np.lib.stride_tricks.sliding_window_view(x, window, axis=-1), axis=-1)
+    return out
+
+def trailing_mean(x, window):
+    # NaN-skipping mean of the last `window` values at every bar; over a window no longer than
+    # `window` bars the last value is the plain mean of the whole window.
+    valid = ~np.isnan(x)
+    zeros = np.zeros(x.shape[:-1] + (1,))
+    total = np.concatenate([zeros, np.cumsum(np.where(valid, x, 0.0), axis=-1)], axis=-1)
+    count = np.concatenate([zeros, np.cumsum(valid, axis=-1)], axis=-1)
+    end = np.arange(1, x.shape[-1] + 1)
+    start = np.maximum(end - window, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (total[..., end] - total[..., start]) / (count[..., end] - count[..., start])
+
+def detect(open_, high, low, close, window=MAX_BARS):
+    # Every detector on every bar in one pass, along the last axis, so the same call serves one
+    # pair's history (1-D) and a (pairs x bars) panel (2-D). Each value at bar i uses only bars up
+    # to i, with averages over the trailing `window` bars the live signal sees.
+    o, h, l, c = (np.asarray(x, dtype=float) for x in (open_, high, low, close))
+    bar_range = h - l
+    range_mean = trailing_mean(bar_range, window)
+    prev_o, prev_c = _shift(o), _shift(c)
+    found = {"range_mean": range_mean}
+
+    body = np.abs(c - o)
+    upper_wick = h - np.maximum(o, c)
+    lower_wick = np.minimum(o, c) - l
+    range_size = np.where(bar_range == 0, 0.0001, bar_range)
+    prev_body = np.abs(prev_c - prev_o)
+    pin_up = (upper_wick > 2 * body) & (lower_wick < body) & (range_size > range_mean)
+    pin_down = (lower_wick > 2 * body) & (upper_wick < body) & (range_size > range_mean)
+    found["pattern"] = np.select([
+        pin_up, pin_down,
+        (body > prev_body) & (c > o) & (prev_c < prev_o),
+        (body > prev_body) & (c < o) & (prev_c > prev_o),
+    ], [
+        np.where(c < o, BEARISH_PIN, BULLISH_PIN), np.where(c > o, BULLISH_PIN, BEARISH_PIN),
+        BULLISH_ENGULFING, BEARISH_ENGULFING,
+    ], NO_PATTERN).astype(np.int8)
+
+    found["support"] = _rolling(l, 20, np.min)
+    found["resistance"] = _rolling(h, 20, np.max)
+    margin = bar_range * 0.3
+    found["breakout_up"] = (prev_c < found["resistance"]) & (c > found["resistance"]) & (c - found["resistance"] > margin)
+    found["breakout_down"] = (prev_c > found["support"]) & (c < found["support"]) & (found["support"] - c > margin)
+
+    # A centred 5-bar swing is complete two bars later, so the latest one at bar i is centred on i-2.
+    swing_high = _rolling(h, 5, np.max)
+    swing_low = _rolling(l, 5, np.min)
+    higher = (swing_high > _shift(swing_high)) & (swing_low > _shift(swing_low))
+    lower = (swing_high < _shift(swing_high)) & (swing_low < _shift(swing_low))
+    found["structure"] = np.select([higher, lower], [BULLISH, BEARISH], CONSOLIDATION).astype(np.int8)
+
+    # An order block is a quiet bar followed by a large move, so it is known one bar later.
+    found["order_block"] = (_shift(bar_range) < range_mean * 0.5) & (np.abs(c - prev_c) > range_mean)
+    found["ob_level"] = prev_c
+    found["fvg_high"] = _shift(h, 2)
+    found["fvg_low"] = _shift(l)
+    found["fvg"] = (found["fvg_high"] - found["fvg_low"]) > range_mean * 1.5
+    return found
+
+def detect_frame(df, window=MAX_BARS):
+    # Indicator frames hold each column as a view, so this reads OHLC without copying the frame.
+    return detect(*(df[column].to_numpy() for column in ("open", "high", "low", "close")), window=window)
+
+def at(found, index=-1):
+    return {key: values[index] for key, values in found.items()}
+
+def bullish(found):
+    pattern = found["pattern"]
+    return (found["structure"] == BULLISH) | (pattern == BULLISH_PIN) | (pattern == BULLISH_ENGULFING)
+
+def bearish(found):
+    pattern = found["pattern"]
+    return (found["structure"] == BEARISH) | (pattern == BEARISH_PIN) | (pattern == BEARISH_ENGULFING)
+
+def describe(bar):
+    # Display strings for one bar's detections. Liquidity zones need the swing centred on the latest
+    # bar, which is never complete, so none is ever reported.
+    if bar["breakout_up"]:
+        breakout = f"Breakout above {bar['resistance']:.5f}"
+    elif bar["breakout_down"]:
+        breakout = f"Breakout below {bar['support']:.5f}"
+    else:
+        breakout = "No breakout"
+    return {
+        "pattern": str(PATTERNS[bar["pattern"]]),
+        "breakout": breakout,
+        "structure": str(STRUCTURES[bar["structure"]]),
+        "ob": f"OB at {bar['ob_level']:.5f}" if bar["order_block"] else "No recent OB",
+        "lz": "No LZ",
+        "fvg": f"FVG at {bar['fvg_high']:.5f}-{bar['fvg_low']:.5f}" if bar["fvg"] else "No FVG",
+    }
+
+def active_zones(found, high, low, index, limit=3):
+    # Order-block bars and fair value gaps that price has not traded back into since they were
+    # detected, newest first: (kind, start time, bottom, top) for chart overlays.
+    high, low = np.asarray(high, dtype=float), np.asarray(low, dtype=float)
+    bars = np.arange(len(high))
+    zones = []
+    for kind, flags, offset, bottom, top in (
+            ("OB", found["order_block"], 1, _shift(low), _shift(high)),
+            ("FVG", found["fvg"], 2, found["fvg_low"], found["fvg_high"])):
+        detected = np.flatnonzero(flags)
+        if not len(detected):
+            continue
+        bottoms, tops = bottom[detected], top[detected]
+        touched = ((bars > detected[:, None]) & (low <= tops[:, None]) & (high >= bottoms[:, None])).any(axis=1)
+        for i in np.flatnonzero(~touched)[::-1][:limit]:
+            zones.append((kind, index[detected[i] - offset], float(bottoms[i]), float(tops[i])))
+    return zones
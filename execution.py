@@ -0,0 +1,157 @@
+import asyncio
+import cProfile
+import io
+import multiprocessing
+import os
+import pstats
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from time import perf_counter
+
+from oanda import config, MAX_CONCURRENCY
+from graphics import generate_chart, generate_comparison_chart, warm_up
+from metrics import TIMINGS
+import panel
+from orders import ORDERS
+from trading_strategy import STORE, SIGNAL_CACHE, CORRELATIONS
+
+# Network waits go to a thread pool sharing the pooled OANDA session; indicator and chart work
+# goes to worker processes so neither blocks the Telegram and Discord event loops.
+IO_POOL = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY * 2, thread_name_prefix="io")
+FETCH_POOL = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="fetch")
+CPU_WORKERS = int(config.get("cpu_workers", max(1, (os.cpu_count() or 2) - 1)))
+_cpu_pool = None
+_cpu_pool_lock = threading.Lock()
+
+def cpu_pool():
+    # Created on first use from the event loop or a fetch thread, so creation is locked. Workers are
+    # spawned rather than forked from this threaded process, and build the chart template on start.
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, initializer=warm_up,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _cpu_pool
+
+def start():
+    # Spawn the CPU workers up front so the first chart or "Compare all" does not wait for them.
+    return [cpu_pool().submit(int) for _ in range(CPU_WORKERS)]
+
+async def run_io(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(IO_POOL, partial(func, *args, **kwargs))
+
+async def run_cpu(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool(), partial(func, *args, **kwargs))
+
+def _compute_signals(granularity, missing):
+    frames = dict(zip(missing, FETCH_POOL.map(lambda pair: STORE.get(pair, granularity), missing)))
+    # Higher timeframes are resampled here, where the incremental resampler state lives. The panel's
+    # time includes the hop to the worker process.
+    with TIMINGS.time("indicators", path="panel"):
+        CORRELATIONS.update(granularity, frames)
+        timeframes = panel.resample_frames(frames, granularity)
+        return cpu_pool().submit(panel.generate_signals, frames, True, timeframes).result()
+
+def compute_all_signals(pairs, granularity):
+    # Blocking: cached signals, with the rest fetched and computed as one panel.
+    return SIGNAL_CACHE.get_many(list(pairs), granularity, partial(_compute_signals, granularity))
+
+async def get_all_signals(pairs, granularity):
+    signals = await run_io(compute_all_signals, pairs, granularity)
+    if ORDERS.running:
+        # Orders are keyed by candle, so re-serving a cached signal never queues it twice.
+        await ORDERS.submit_all(signals, granularity)
+    return signals
+
+def _timed(render, *args):
+    # Timed inside the worker, so the render stage is the drawing alone, not the wait for a free worker.
+    start = perf_counter()
+    image = render(*args)
+    return image, perf_counter() - start
+
+class ChartCache:
+    # Rendered PNGs keyed by (pair, granularity, last candle time, chart type), so each chart is drawn
+    # once per candle; concurrent requests for a chart that is still rendering share the same task.
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._pending = {}
+
+    async def get(self, key, render, *args):
+        if key in self._images:
+            self.hits += 1
+            self._images.move_to_end(key)
+            return self._images[key]
+        if key in self._pending:
+            self.hits += 1
+            return (await asyncio.shield(self._pending[key]))[0]
+        self.misses += 1
+        task = self._pending[key] = asyncio.ensure_future(run_cpu(_timed, render, *args))
+        try:
+            image, seconds = await asyncio.shield(task)
+        finally:
+            self._pending.pop(key, None)
+        TIMINGS.observe("render", seconds, chart=key[-1])
+        if image is not None:
+            self._images[key] = image
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+        return image
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._images)}
+
+CHARTS = ChartCache()
+
+async def render_chart(df, pair, granularity, zones=()):
+    if df.empty:
+        return None
+    return await CHARTS.get((pair, granularity, df.index[-1], "chart"), generate_chart, df, pair, zones)
+
+async def render_charts(signals, granularity):
+    # Fan the batch out across the worker processes; each worker reuses its own figure template.
+    charts = await asyncio.gather(*(render_chart(data["df"], pair, granularity, data.get("zones", ()))
+                                    for pair, data in signals.items()))
+    return dict(zip(signals, charts))
+
+async def render_comparison(signals, granularity):
+    # Trend strength of the requested pairs with the currency strength and the correlation heatmap
+    # of the latest committed bar, so the key changes once per close.
+    correlations = CORRELATIONS.snapshot(granularity)
+    key = (tuple((pair, data["df"].index[-1]) for pair, data in signals.items()), granularity,
+           correlations["time"], "comparison")
+    strengths = {pair: {"strength": data["strength"]} for pair, data in signals.items()}
+    return await CHARTS.get(key, generate_comparison_chart, strengths, correlations)
+
+def profile_cycle(pairs, granularity, top=30):
+    # One full update cycle (fetch, indicators, every chart) run inline on the calling thread under
+    # cProfile, bypassing the caches and the worker processes the profiler cannot see into.
+    pairs = list(pairs)
+
+    def cycle():
+        frames = {pair: STORE.get(pair, granularity) for pair in pairs}
+        CORRELATIONS.update(granularity, frames)
+        signals = panel.generate_signals(frames, True, panel.resample_frames(frames, granularity))
+        for pair, data in signals.items():
+            generate_chart(data["df"], pair, data["zones"])
+        generate_comparison_chart({pair: {"strength": data["strength"]} for pair, data in signals.items()},
+                                  CORRELATIONS.snapshot(granularity))
+
+    profiler = cProfile.Profile()
+    profiler.runcall(cycle)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+    return out.getvalue()
+
+def shutdown():
+    global _cpu_pool
+    IO_POOL.shutdown(wait=False, cancel_futures=True)
+    FETCH_POOL.shutdown(wait=False, cancel_futures=True)
+    with _cpu_pool_lock:
+        if _cpu_pool is not None:
+            _cpu_pool.shutdown(wait=False, cancel_futures=True)
+            _cpu_pool = None
@@ -1,47 +1,165 @@
+import io
+import threading
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import PolyCollection
+
+def _png_bytes(fig, close=True):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=100)
+    if close:
+        plt.close(fig)
+    return buffer.getvalue()
+
+def _padded(low, high, margin=0.05):
+    pad = (high - low) * margin or abs(high) * margin or 1.0
+    return low - pad, high + pad
+
+class ChartTemplate:
+    # The 3-panel price/RSI/MACD figure is laid out once per process; each chart only swaps the
+    # line data, the histogram polygons and the labels before rendering.
+    def __init__(self):
+        fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(10, 8), height_ratios=[3, 1, 1], sharex=True)
+        self.fig, self.axes = fig, (ax1, ax2, ax3)
+
+        self.close, = ax1.plot([], [], label="Close", color="blue")
+        self.sma50, = ax1.plot([], [], label="SMA50", color="orange")
+        self.sma200, = ax1.plot([], [], label="SMA200", color="green")
+        self.support = ax1.axhline(0, color="green", linestyle="--", label="S")
+        self.resistance = ax1.axhline(0, color="red", linestyle="--", label="R")
+        # Active order-block and fair value gap zones, drawn from their bar to the right edge.
+        self.ob_zones = PolyCollection([], facecolor="orange", alpha=0.2, label="OB")
+        self.fvg_zones = PolyCollection([], facecolor="teal", alpha=0.2, label="FVG")
+        ax1.add_collection(self.ob_zones, autolim=False)
+        ax1.add_collection(self.fvg_zones, autolim=False)
+        self.title = ax1.set_title("Price Action")
+        self.price_legend = ax1.legend(loc="upper left")
+        ax1.grid(True)
+
+        self.rsi, = ax2.plot([], [], label="RSI", color="purple")
+        ax2.axhline(70, color="red", linestyle="--")
+        ax2.axhline(30, color="green", linestyle="--")
+        ax2.set_ylim(0, 100)
+        ax2.set_title("RSI")
+        ax2.legend(loc="upper left")
+        ax2.grid(True)
+
+        self.macd, = ax3.plot([], [], label="MACD", color="blue")
+        self.macd_signal, = ax3.plot([], [], label="Signal", color="orange")
+        self.hist = PolyCollection([], facecolor="gray", alpha=0.5, label="Hist")
+        ax3.add_collection(self.hist, autolim=False)
+        ax3.axhline(0, color="black", linestyle="--")
+        ax3.set_title("MACD")
+        ax3.legend(loc="upper left")
+        ax3.grid(True)
+
+        locator = mdates.AutoDateLocator()
+        ax3.xaxis.set_major_locator(locator)
+        ax3.xaxis.set_major_formatter(mdates.AutoDateFormatter(locator))
+        fig.tight_layout()
+        # Freeze the layout: no second layout pass per render, and a fixed legend corner instead of
+        # "best", whose placement search over 500-point lines cost more than drawing the chart.
+        fig.set_layout_engine("none")
+        self.lock = threading.Lock()
+
+    def render(self, df, pair, zones=()):
+        index = df.index.tz_convert(None) if df.index.tz is not None else df.index
+        x = mdates.date2num(index.to_numpy())
+        hist = df["macd_hist"].to_numpy(dtype=float)
+        support, resistance = df["low"].iloc[-20:].min(), df["high"].iloc[-20:].max()
+        width = 0.8 * (np.median(np.diff(x)) if len(x) > 1 else 1.0)
+        shown = ~np.isnan(hist)
+        left, right, top = x[shown] - width / 2, x[shown] + width / 2, hist[shown]
+        zero = np.zeros_like(top)
+        verts = np.stack([np.column_stack([left, zero]), np.column_stack([left, top]),
+                          np.column_stack([right, top]), np.column_stack([right, zero])], axis=1)
+        boxes = {"OB": [], "FVG": []}
+        for kind, start, bottom, top in zones:
+            begin = mdates.date2num(start.tz_convert(None) if start.tzinfo is not None else start)
+            boxes[kind].append([(begin, bottom), (begin, top), (x[-1], top), (x[-1], bottom)])
 
-def generate_chart(df, pair):
+        with self.lock:
+            ax1, ax2, ax3 = self.axes
+            self.close.set_data(x, df["close"].to_numpy())
+            self.sma50.set_data(x, df["sma50"].to_numpy())
+            self.sma200.set_data(x, df["sma200"].to_numpy())
+            self.support.set_ydata([support, support])
+            self.resistance.set_ydata([resistance, resistance])
+            texts = self.price_legend.get_texts()
+            texts[3].set_text(f"S: {support:.5f}")
+            texts[4].set_text(f"R: {resistance:.5f}")
+            self.title.set_text(f"{pair} Price Action")
+            self.rsi.set_data(x, df["rsi"].to_numpy())
+            self.macd.set_data(x, df["macd"].to_numpy())
+            self.macd_signal.set_data(x, df["macd_signal"].to_numpy())
+            self.hist.set_verts(verts)
+            self.ob_zones.set_verts(boxes["OB"])
+            self.fvg_zones.set_verts(boxes["FVG"])
+
+            ax1.set_xlim(*_padded(x[0], x[-1]))
+            price = [df[column].to_numpy() for column in ("close", "sma50", "sma200")]
+            ax1.set_ylim(*_padded(min(min(np.nanmin(values) for values in price), support),
+                                  max(max(np.nanmax(values) for values in price), resistance)))
+            macd = np.concatenate([df["macd"].to_numpy(dtype=float), df["macd_signal"].to_numpy(dtype=float), hist, [0.0]])
+            ax3.set_ylim(*_padded(np.nanmin(macd), np.nanmax(macd)))
+            return _png_bytes(self.fig, close=False)
+
+_template = None
+_template_lock = threading.Lock()
+
+def chart_template():
+    global _template
+    with _template_lock:
+        if _template is None:
+            _template = ChartTemplate()
+        return _template
+
+def warm_up(_=None):
+    chart_template()
+
+def generate_chart(df, pair, zones=()):
     if df.empty or len(df) < 50:
-        return
-    
-    fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(10, 8), height_ratios=[3, 1, 1], sharex=True)
-    
-    ax1.plot(df.index, df["close"], label="Close", color="blue")
-    ax1.plot(df.index, df["sma50"], label="SMA50", color="orange")
-    ax1.plot(df.index, df["sma200"], label="SMA200", color="green")
-    support, resistance = df["low"].rolling(window=20).min().iloc[-1], df["high"].rolling(window=20).max().iloc[-1]
-    ax1.axhline(support, color="green", linestyle="--", label=f"S: {support:.5f}")
-    ax1.axhline(resistance, color="red", linestyle="--", label=f"R: {resistance:.5f}")
-    ax1.set_title(f"{pair} Price Action")
-    ax1.legend()
-    ax1.grid(True)
-    
-    ax2.plot(df.index, df["rsi"], label="RSI", color="purple")
-    ax2.axhline(70, color="red", linestyle="--")
-    ax2.axhline(30, color="green", linestyle="--")
-    ax2.set_ylim(0, 100)
-    ax2.set_title("RSI")
-    ax2.legend()
-    ax2.grid(True)
-    
-    ax3.plot(df.index, df["macd"], label="MACD", color="blue")
-    ax3.plot(df.index, df["macd_signal"], label="Signal", color="orange")
-    ax3.bar(df.index, df["macd_hist"], label="Hist", color="gray", alpha=0.5)
-    ax3.axhline(0, color="black", linestyle="--")
-    ax3.set_title("MACD")
-    ax3.legend()
-    ax3.grid(True)
-    
-    plt.tight_layout()
-    plt.savefig(f"chart_{pair.replace('_', '')}.png", dpi=100)
-    plt.close()
-
-def generate_comparison_chart(signals):
+        return None
+    return chart_template().render(df, pair, zones)
+
+def generate_comparison_chart(signals, correlations=None):
+    # correlations is a CorrelationEngine snapshot: currency strength next to the trend strength,
+    # and the requested pairs' correlations with every pair below them.
     strengths = {pair: data["strength"] for pair, data in signals.items() if data["strength"] is not None}
-    plt.figure(figsize=(10, 6))
-    plt.bar(strengths.keys(), strengths.values(), color="purple")
-    plt.xticks(rotation=90)
-    plt.title("Trend Strength Comparison")
-    plt.tight_layout()
-    plt.savefig("comparison_chart.png", dpi=100)
-    plt.close()
+    if correlations is None:
+        fig = plt.figure(figsize=(10, 6))
+        plt.bar(strengths.keys(), strengths.values(), color="purple")
+        plt.xticks(rotation=90)
+        plt.title("Trend Strength Comparison")
+        plt.tight_layout()
+        return _png_bytes(fig)
+
+    fig = plt.figure(figsize=(12, 11))
+    grid = fig.add_gridspec(2, 2, height_ratios=[1, 1.6], width_ratios=[1.6, 1])
+    ax1, ax2, ax3 = fig.add_subplot(grid[0, 0]), fig.add_subplot(grid[0, 1]), fig.add_subplot(grid[1, :])
+    ax1.bar(strengths.keys(), strengths.values(), color="purple")
+    ax1.tick_params(axis="x", rotation=90, labelsize=7)
+    ax1.set_title("Trend Strength Comparison")
+
+    strength = np.nan_to_num(correlations["strength"])
+    ax2.barh(correlations["currencies"], strength, color=np.where(strength >= 0, "green", "red"))
+    ax2.axvline(0, color="black", linewidth=0.8)
+    ax2.invert_yaxis()
+    ax2.set_title(f"Currency Strength (% over {correlations['bars']} bars)")
+
+    pairs = correlations["pairs"]
+    rows = [pairs.index(pair) for pair in signals if pair in pairs]
+    cmap = plt.get_cmap("RdBu_r").copy()
+    cmap.set_bad("lightgray")
+    image = ax3.imshow(np.ma.masked_invalid(correlations["correlation"][rows]), cmap=cmap, vmin=-1, vmax=1,
+                       aspect="auto", interpolation="nearest")
+    ax3.set_xticks(range(len(pairs)), pairs, rotation=90, fontsize=7)
+    ax3.set_yticks(range(len(rows)), [pairs[i] for i in rows], fontsize=7)
+    ax3.set_title("Return Correlation")
+    fig.colorbar(image, ax=ax3, fraction=0.03)
+    fig.tight_layout()
+    return _png_bytes(fig)
@@ -0,0 +1,227 @@
+import math
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from oanda import config
+
+COLUMNS = ["range", "sma50", "sma200", "rsi", "macd", "macd_signal", "macd_hist", "atr",
+           "trend_strength", "di_plus", "di_minus", "adx"]
+OHLC = ["open", "high", "low", "close"]
+FIELDS = OHLC + COLUMNS
+# Storage type of indicator frames: float32 halves their memory but keeps only ~7 significant
+# digits, so SL/TP levels of high-priced instruments such as BTC_USD lose their last decimals.
+DTYPE = np.dtype(config.get("indicator_dtype", "float64"))
+NAN = float("nan")
+
+def indicator_frame(index, ohlc, values=None, dtype=None):
+    # The frame signals, charts and detectors read: FIELDS over one preallocated (fields x bars)
+    # block wrapped without copying, so every column is a contiguous view and nothing is inserted
+    # column by column. values holds the COLUMNS rows; None leaves them NaN.
+    block = np.empty((len(FIELDS), len(index)), dtype=dtype or DTYPE)
+    block[:len(OHLC)] = ohlc
+    block[len(OHLC):] = NAN if values is None else values
+    return pd.DataFrame(block.T, index=index, columns=FIELDS, copy=False)
+
+def _div(a, b):
+    # Float division with pandas semantics: x/0 is +-inf, 0/0 and anything with NaN is NaN.
+    if b == 0:
+        return NAN if a == 0 or math.isnan(a) else math.copysign(math.inf, a)
+    return a / b
+
+class RollingMean:
+    # pandas rolling(window).mean() with the default min_periods: NaN until the window is full
+    # and while any NaN is inside it.
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.nans = 0
+        self.pushes = 0
+
+    def value_with(self, x):
+        values = self.values
+        full = len(values) == self.window
+        count = len(values) + (0 if full else 1)
+        nans = self.nans + math.isnan(x) - (full and math.isnan(values[0]))
+        if count < self.window or nans:
+            return NAN
+        total = self.total + (0.0 if math.isnan(x) else x)
+        if full and not math.isnan(values[0]):
+            total -= values[0]
+        return total / self.window
+
+    def push(self, x):
+        values = self.values
+        if len(values) == self.window:
+            old = values.popleft()
+            if math.isnan(old):
+                self.nans -= 1
+            else:
+                self.total -= old
+        values.append(x)
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            self.total += x
+        self.pushes += 1
+        if self.pushes % self.window == 0:
+            # Re-sum once per window so float drift cannot build up over a long-running stream.
+            self.total = math.fsum(v for v in values if not math.isnan(v))
+
+class Ema:
+    # pandas ewm(span=span, adjust=False).mean().
+    def __init__(self, span):
+        self.alpha = 2 / (span + 1)
+        self.value = None
+
+    def value_with(self, x):
+        if self.value is None:
+            return x
+        return self.alpha * x + (1 - self.alpha) * self.value
+
+    def push(self, x):
+        self.value = self.value_with(x)
+
+class IndicatorState:
+    # Running state for every column calculate_indicators produces, advanced one candle at a time.
+    def __init__(self):
+        self.sma50 = RollingMean(50)
+        self.sma200 = RollingMean(200)
+        self.gain = RollingMean(14)
+        self.loss = RollingMean(14)
+        self.ema12 = Ema(12)
+        self.ema26 = Ema(26)
+        self.macd_signal = Ema(9)
+        self.atr = RollingMean(14)
+        self.tr = RollingMean(14)
+        self.dm_plus = RollingMean(14)
+        self.dm_minus = RollingMean(14)
+        self.dx = RollingMean(14)
+        self.prev = None
+
+    def step(self, high, low, close, commit=True):
+        pushes = []
+
+        def roll(stat, x):
+            pushes.append((stat, x))
+            return stat.value_with(x)
+
+        prev = self.prev
+        rng = high - low
+        sma50 = roll(self.sma50, close)
+        sma200 = roll(self.sma200, close)
+        delta = close - prev[2] if prev else NAN
+        gain = roll(self.gain, delta if delta > 0 else 0.0)
+        loss = roll(self.loss, -delta if delta < 0 else 0.0)
+        rs = NAN if loss == 0 or math.isnan(loss) else gain / loss
+        rsi = 100 - (100 / (1 + rs)) if not math.isnan(rs) else NAN
+        ema12 = roll(self.ema12, close)
+        ema26 = roll(self.ema26, close)
+        macd = ema12 - ema26
+        macd_signal = roll(self.macd_signal, macd)
+        atr = roll(self.atr, rng)
+        tr = max(rng, abs(high - prev[2]), abs(low - prev[2])) if prev else rng
+        up = high - prev[0] if prev else 0.0
+        down = prev[1] - low if prev else 0.0
+        atr_tr = roll(self.tr, tr)
+        di_plus = 100 * _div(roll(self.dm_plus, up if up > 0 else 0.0), atr_tr)
+        di_minus = 100 * _div(roll(self.dm_minus, down if down > 0 else 0.0), atr_tr)
+        di_sum = di_plus + di_minus
+        dx = NAN if di_sum == 0 or math.isnan(di_sum) else 100 * abs(di_plus - di_minus) / di_sum
+        adx = roll(self.dx, dx)
+        trend = _div(abs(sma50 - sma200), sma200) * 100
+
+        if commit:
+            for stat, x in pushes:
+                stat.push(x)
+            self.prev = (high, low, close)
+        return (rng, sma50, sma200, rsi, macd, macd_signal, macd - macd_signal, atr,
+                trend, di_plus, di_minus, adx)
+
+class IndicatorEngine:
+    # Commits each complete candle once and evaluates the still-forming candle on a throwaway step,
+    # so serving a signal costs O(1) indicator work per new candle instead of a full recompute.
+    def __init__(self, max_bars=500):
+        self.max_bars = max_bars
+        self.state = IndicatorState()
+        self.times = deque(maxlen=max_bars)
+        self.bars = deque(maxlen=max_bars)
+        self.rows = deque(maxlen=max_bars)
+
+    def _commit(self, time, high, low, close):
+        self.rows.append(self.state.step(high, low, close))
+        self.times.append(time)
+        self.bars.append((high, low, close))
+
+    def _lines_up(self, index, hlc, start):
+        # The committed bars still in the frame must match it exactly: the store replaces bars built
+        # from the pricing stream with OANDA's own candles, which keep the time but not always the values.
+        if start == 0 or index[start - 1] != self.times[-1]:
+            return False
+        count = min(start, len(self.times))
+        times = index[start - count:start]
+        if times[0] != self.times[-count]:
+            return False
+        committed = np.array(self.bars, dtype=float)[-count:]
+        return np.array_equal(committed, hlc[start - count:start])
+
+    def sync(self, df, last_complete=None):
+        if df.empty:
+            return df
+        index = df.index
+        complete = 0 if last_complete is None else index.searchsorted(last_complete, side="right")
+        start = 0
+        hlc = df[["high", "low", "close"]].to_numpy(dtype=float)
+        if self.times:
+            start = index.searchsorted(self.times[-1], side="right")
+            if not self._lines_up(index, hlc, start):
+                # History no longer lines up with the committed state (reload, gap or replaced bars);
+                # replay it.
+                self.__init__(self.max_bars)
+                start = 0
+        high, low, close = hlc.T
+        for i in range(start, complete):
+            self._commit(index[i], float(high[i]), float(low[i]), float(close[i]))
+        rows = list(self.rows)
+        for i in range(max(complete, start), len(df)):
+            rows.append(self.state.step(float(high[i]), float(low[i]), float(close[i]), commit=False))
+        return self._frame(df, rows)
+
+    def _frame(self, df, rows):
+        ohlc = df[OHLC].to_numpy(dtype=float).T
+        if len(df) < 50:
+            return indicator_frame(df.index, ohlc)
+        values = np.array(rows[-len(df):], dtype=float)
+        pad = len(df) - len(values)
+        if pad:
+            values = np.vstack([np.full((pad, len(COLUMNS)), np.nan), values])
+        values = values.T
+        if len(df) < 200:
+            # calculate_indicators falls back to the mean of the whole window for short histories.
+            sma50, sma200 = values[COLUMNS.index("sma50")], values[COLUMNS.index("sma200")]
+            sma200[:] = ohlc[3].mean()
+            values[COLUMNS.index("trend_strength")] = np.abs(sma50 - sma200) / sma200 * 100
+        return indicator_frame(df.index, ohlc, values)
+
+class IndicatorEngines:
+    def __init__(self, max_bars=500):
+        self.max_bars = max_bars
+        self._engines = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def frame(self, pair, granularity, df):
+        key = (pair, granularity)
+        with self._lock:
+            engine = self._engines.setdefault(key, IndicatorEngine(self.max_bars))
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            # Frames without store metadata (e.g. from fetch_data) are treated as fully closed.
+            return engine.sync(df, df.attrs.get("last_complete", df.index[-1] if len(df) else None))
+
+    def clear(self):
+        with self._lock:
+            self._engines.clear()
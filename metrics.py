@@ -0,0 +1,126 @@
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGES = ("fetch", "parse", "indicators", "render", "send")
+
+class Histogram:
+    # Latency histogram in seconds: cumulative fixed buckets for the whole run, plus the most recent
+    # samples for percentiles.
+    def __init__(self, buckets=BUCKETS, recent=1000):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self._recent.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            values = sorted(self._recent)
+            count, total, counts = self.count, self.total, list(self.counts)
+        if not values:
+            return {"count": 0}
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            cumulative[bound] = running
+        return {"count": count, "sum": total, "mean_ms": total / count * 1000, "p50_ms": values[len(values) // 2] * 1000,
+                "p99_ms": values[int(len(values) * 0.99)] * 1000, "max_ms": values[-1] * 1000, "buckets": cumulative}
+
+class Timings:
+    # Histograms per pipeline stage (fetch, parse, indicators, render, send), each also split by
+    # labels such as the pair or the chat platform when the caller gives them.
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._stages = {}
+        self._labelled = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, stage, seconds, **labels):
+        self._histogram(self._stages, stage).observe(seconds)
+        if labels:
+            self._histogram(self._labelled, (stage, tuple(sorted(labels.items())))).observe(seconds)
+
+    @contextmanager
+    def time(self, stage, **labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, perf_counter() - start, **labels)
+
+    def snapshot(self, stage=None):
+        with self._lock:
+            stages = dict(self._stages)
+            labelled = dict(self._labelled)
+        if stage is not None:
+            return {labels: histogram.snapshot() for (name, labels), histogram in labelled.items() if name == stage}
+        return {name: histogram.snapshot() for name, histogram in stages.items()}
+
+    def prometheus(self, prefix="fxbot_stage_seconds"):
+        # Stages timed with labels are exported per label set (sum them in PromQL for the total).
+        with self._lock:
+            series = {(stage, labels): histogram for (stage, labels), histogram in self._labelled.items()}
+            series.update({(stage, ()): histogram for stage, histogram in self._stages.items()
+                           if not any(name == stage for name, _ in self._labelled)})
+        lines = [f"# HELP {prefix} Time spent in each pipeline stage.", f"# TYPE {prefix} histogram"]
+        for (stage, labels), histogram in sorted(series.items()):
+            snapshot = histogram.snapshot()
+            if not snapshot["count"]:
+                continue
+            tags = ",".join([f'stage="{stage}"'] + [f'{key}="{value}"' for key, value in labels])
+            for bound, count in snapshot["buckets"].items():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{prefix}_bucket{{{tags},le="{le}"}} {count}')
+            lines.append(f"{prefix}_sum{{{tags}}} {snapshot['sum']}")
+            lines.append(f"{prefix}_count{{{tags}}} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+            self._labelled.clear()
+
+TIMINGS = Timings()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.timings.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve_metrics(port, host="127.0.0.1", timings=TIMINGS):
+    # Prometheus text endpoint at /metrics on a daemon thread.
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.timings = timings
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -0,0 +1,57 @@
+import json
+import threading
+from time import monotonic, sleep
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    with open("config.json", "r") as f:
+        config = json.load(f)
+except FileNotFoundError:
+    print("config.json not found. Ensure it exists with correct credentials.")
+    exit(1)
+
+BASE_URL = "https://api-fxpractice.oanda.com/v3"
+HEADERS = {"Authorization": f"Bearer {config['oanda_api_token']}", "Content-Type": "application/json"}
+
+MAX_CONCURRENCY = int(config.get("max_concurrency", 8))
+REQUEST_TIMEOUT = float(config.get("request_timeout", 10))
+MAX_RETRIES = 3
+
+def pooled_session(pool_size):
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+SESSION = pooled_session(MAX_CONCURRENCY)
+
+_backoff_lock = threading.Lock()
+_backoff_until = 0.0
+
+def api_url(path):
+    return f"{BASE_URL}{path}"
+
+def _wait_for_backoff():
+    delay = _backoff_until - monotonic()
+    if delay > 0:
+        sleep(delay)
+
+def _set_backoff(delay):
+    global _backoff_until
+    with _backoff_lock:
+        _backoff_until = max(_backoff_until, monotonic() + delay)
+
+def api_get(path, params=None):
+    # One shared keep-alive pool for every worker; a 429 pauses all workers, not just the one that hit it.
+    for attempt in range(MAX_RETRIES + 1):
+        _wait_for_backoff()
+        response = SESSION.get(api_url(path), params=params, timeout=REQUEST_TIMEOUT)
+        if response.status_code != 429 or attempt == MAX_RETRIES:
+            response.raise_for_status()
+            return response.json()
+        retry_after = response.headers.get("Retry-After")
+        _set_backoff(float(retry_after) if retry_after else 0.5 * 2 ** attempt)
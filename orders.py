@@ -0,0 +1,144 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+
+import requests
+
+from oanda import config, SESSION, MAX_CONCURRENCY, REQUEST_TIMEOUT, api_url, pooled_session
+from metrics import Histogram
+
+ORDER_UNITS = int(config.get("order_units", 1000))
+ORDER_RETRIES = 3
+ALREADY_PLACED = "CLIENT_ORDER_ID_ALREADY_EXISTS"
+
+def client_order_id(pair, granularity, candle_time, signal):
+    # One order per pair, granularity, candle and direction, however often that signal is re-evaluated.
+    return f"fxbot-{pair}-{granularity}-{candle_time:%Y%m%d%H%M}-{signal}"
+
+def order_request(signal, pair, units, sl, tp, client_id):
+    return {
+        "order": {
+            "units": str(units) if signal == "BUY" else str(-units),
+            "instrument": pair,
+            "type": "MARKET",
+            "stopLossOnFill": {"price": f"{sl:.5f}"},
+            "takeProfitOnFill": {"price": f"{tp:.5f}"},
+            "clientExtensions": {"id": client_id, "tag": "fxbot"}
+        }
+    }
+
+def find_order(client_id, timeout=REQUEST_TIMEOUT, session=SESSION):
+    # The order OANDA holds under a client order ID, in whatever state, or None if there is none.
+    url = api_url(f"/accounts/{config['oanda_account_id']}/orders/@{client_id}")
+    response = session.get(url, timeout=timeout)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json().get("order", {})
+
+def send_order(body, timeout=REQUEST_TIMEOUT, retries=ORDER_RETRIES, session=SESSION):
+    # Every attempt carries the same client order ID, but OANDA only rejects a repeat
+    # (CLIENT_ORDER_ID_ALREADY_EXISTS) while the first order is pending; a MARKET order fills at once,
+    # so posting it again would fill again. The order is therefore looked up by its client ID before
+    # every POST and only sent if OANDA has no such order, which also covers a restart or a second
+    # instance sending the same candle's signal, and a retry after a timeout, lost response or 5xx.
+    url = api_url(f"/accounts/{config['oanda_account_id']}/orders")
+    client_id = body["order"]["clientExtensions"]["id"]
+    for attempt in range(retries + 1):
+        try:
+            if find_order(client_id, timeout, session) is not None:
+                return {"duplicate": True}
+            response = session.post(url, json=body, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError):
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code < 400:
+                return response.json()
+            if response.status_code == 400 and response.json().get("errorCode") == ALREADY_PLACED:
+                return {"duplicate": True}
+            if attempt == retries or (response.status_code != 429 and response.status_code < 500):
+                response.raise_for_status()
+        sleep(min(0.25 * 2 ** attempt, 2.0))
+
+class OrderExecutor:
+    # BUY/SELL signals are queued as orders and sent by a pool of workers, so pairs that signal on the
+    # same candle close go out in parallel. OANDA has no batch order endpoint; concurrent submission is
+    # the batching. The workers get their own session with a connection each, so orders never wait for
+    # a connection behind candle fetches. Latency is measured from queueing to OANDA's response.
+    def __init__(self, workers=MAX_CONCURRENCY, units=ORDER_UNITS, timeout=REQUEST_TIMEOUT, retries=ORDER_RETRIES):
+        self.workers = workers
+        self.units = units
+        self.timeout = timeout
+        self.retries = retries
+        self.latency = Histogram()
+        self.placed = 0
+        self.recovered = 0
+        self.failed = 0
+        self.queue = None
+        self.session = pooled_session(workers)
+        self._seen = OrderedDict()
+        self._tasks = []
+        self._pool = None
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="orders")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    async def submit(self, pair, data, granularity):
+        if data is None or data["signal"] == "HOLD" or data["df"].empty:
+            return False
+        client_id = client_order_id(pair, granularity, data["df"].index[-1], data["signal"])
+        # Only saves queueing a re-served signal twice in this process; send_order's lookup is what
+        # keeps another process from filling it again.
+        if client_id in self._seen:
+            return False
+        self._seen[client_id] = True
+        if len(self._seen) > 4096:
+            self._seen.popitem(last=False)
+        body = order_request(data["signal"], pair, self.units, data["sl"], data["tp"], client_id)
+        await self.queue.put((monotonic(), pair, body))
+        return True
+
+    async def submit_all(self, signals, granularity):
+        return sum([await self.submit(pair, data, granularity) for pair, data in signals.items()])
+
+    async def join(self):
+        await self.queue.join()
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            queued, pair, body = await self.queue.get()
+            try:
+                result = await loop.run_in_executor(self._pool, send_order, body, self.timeout, self.retries, self.session)
+                self.latency.observe(monotonic() - queued)
+                self.placed += 1
+                if result.get("duplicate"):
+                    self.recovered += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Order failed for {pair}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        return {"placed": self.placed, "recovered": self.recovered, "failed": self.failed,
+                "queued": self.queue.qsize() if self.queue is not None else 0, "latency": self.latency.snapshot()}
+
+ORDERS = OrderExecutor()
@@ -0,0 +1,124 @@
+import numpy as np
+
+from detectors import active_zones, at, detect
+from indicators import COLUMNS, OHLC, indicator_frame
+from timeframes import confirm_timeframes, higher_timeframes, trend_bias
+from trading_strategy import RESAMPLER, decide_signal, in_killzone
+
+def stack(frames, bars=None):
+    # Right-align every pair on a (pairs x bars) grid; shorter histories are NaN-padded on the left.
+    pairs = list(frames)
+    n = bars or max(len(df) for df in frames.values())
+    ohlc = {column: np.full((len(pairs), n), np.nan) for column in ("open", "high", "low", "close")}
+    lengths = np.zeros(len(pairs), dtype=int)
+    for i, pair in enumerate(pairs):
+        df = frames[pair].iloc[-n:]
+        lengths[i] = len(df)
+        for column, values in ohlc.items():
+            values[i, n - len(df):] = df[column].to_numpy()
+    return pairs, ohlc, lengths
+
+def rolling_mean(x, window):
+    valid = ~np.isnan(x)
+    total = np.cumsum(np.where(valid, x, 0.0), axis=1)
+    count = np.cumsum(valid, axis=1)
+    total = np.concatenate([np.zeros((len(x), 1)), total], axis=1)
+    count = np.concatenate([np.zeros((len(x), 1), dtype=int), count], axis=1)
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        sums = total[:, window:] - total[:, :-window]
+        full = (count[:, window:] - count[:, :-window]) == window
+        out[:, window - 1:] = np.where(full, sums / window, np.nan)
+    return out
+
+def ewm(x, span):
+    alpha = 2 / (span + 1)
+    out = np.empty_like(x)
+    prev = np.full(len(x), np.nan)
+    for j in range(x.shape[1]):
+        value = x[:, j]
+        prev = np.where(np.isnan(prev), value, alpha * value + (1 - alpha) * prev)
+        out[:, j] = prev
+    return out
+
+def shift(x):
+    return np.concatenate([np.full((len(x), 1), np.nan), x[:, :-1]], axis=1)
+
+def calculate_indicators(ohlc, lengths):
+    high, low, close = ohlc["high"], ohlc["low"], ohlc["close"]
+    valid = ~np.isnan(close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = {"range": high - low}
+        out["sma50"] = rolling_mean(close, 50)
+        sma200 = rolling_mean(close, 200)
+        short = lengths < 200
+        if short.any():
+            sma200[short] = np.nanmean(close[short], axis=1, keepdims=True)
+        out["sma200"] = sma200
+        delta = close - shift(close)
+        gain = rolling_mean(np.where(valid, np.where(delta > 0, delta, 0.0), np.nan), 14)
+        loss = rolling_mean(np.where(valid, np.where(delta < 0, -delta, 0.0), np.nan), 14)
+        rs = gain / np.where(loss == 0, np.nan, loss)
+        out["rsi"] = 100 - (100 / (1 + rs))
+        macd = ewm(close, 12) - ewm(close, 26)
+        out["macd"] = macd
+        out["macd_signal"] = ewm(macd, 9)
+        out["macd_hist"] = macd - out["macd_signal"]
+        out["atr"] = rolling_mean(out["range"], 14)
+        out["trend_strength"] = np.abs(out["sma50"] - sma200) / sma200 * 100
+        prev_close = shift(close)
+        tr = np.fmax(out["range"], np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        up = high - shift(high)
+        down = shift(low) - low
+        dm_plus = np.where(valid, np.where(up > 0, up, 0.0), np.nan)
+        dm_minus = np.where(valid, np.where(down > 0, down, 0.0), np.nan)
+        atr = rolling_mean(tr, 14)
+        out["di_plus"] = 100 * (rolling_mean(dm_plus, 14) / atr)
+        out["di_minus"] = 100 * (rolling_mean(dm_minus, 14) / atr)
+        di_sum = out["di_plus"] + out["di_minus"]
+        dx = 100 * np.abs(out["di_plus"] - out["di_minus"]) / np.where(di_sum == 0, np.nan, di_sum)
+        out["adx"] = rolling_mean(dx, 14)
+    return out
+
+def generate_signals(frames, with_frames=True, timeframes=None):
+    # timeframes maps each higher timeframe to its resampled frames, evaluated as one more panel.
+    frames = {pair: df for pair, df in frames.items() if not df.empty}
+    if not frames:
+        return {}
+    higher = {tf: generate_signals(tf_frames, with_frames=False) for tf, tf_frames in (timeframes or {}).items()}
+    pairs, ohlc, lengths = stack(frames)
+    ind = calculate_indicators(ohlc, lengths)
+    found = detect(ohlc["open"], ohlc["high"], ohlc["low"], ohlc["close"])
+    signals = {}
+    for i, pair in enumerate(pairs):
+        df = frames[pair]
+        n = len(df)
+        views = {tf: {"signal": tf_signals[pair]["signal"], "bias": tf_signals[pair]["bias"]} if pair in tf_signals
+                 else {"signal": "HOLD", "bias": "Unknown"} for tf, tf_signals in higher.items()}
+        zones = []
+        if lengths[i] < 50:
+            result = ("HOLD", 0.0, 0.0, 0.0, "No data.", "Wait for data.", 0.0)
+            bias = "Unknown"
+        else:
+            latest = {column: ind[column][i, -1] for column in COLUMNS}
+            prev = {column: ind[column][i, -2] for column in COLUMNS}
+            latest["close"], prev["close"] = ohlc["close"][i, -1], ohlc["close"][i, -2]
+            result = decide_signal(latest, prev, at(found, (i, -1)), in_killzone(df.index[-1]))
+            if views:
+                result = confirm_timeframes(result, {tf: view["bias"] for tf, view in views.items()})
+            bias = trend_bias(latest)
+            if with_frames:
+                zones = active_zones({key: values[i, -n:] for key, values in found.items()},
+                                     ohlc["high"][i, -n:], ohlc["low"][i, -n:], df.index)
+        if with_frames:
+            df = indicator_frame(df.index, [ohlc[column][i, -n:] for column in OHLC],
+                                 [ind[column][i, -n:] for column in COLUMNS] if lengths[i] >= 50 else None)
+        signals[pair] = {"signal": result[0], "strength": result[1], "sl": result[2],
+                         "tp": result[3], "df": df, "analysis": result[4],
+                         "recommendation": result[5], "confidence": result[6],
+                         "bias": bias, "timeframes": views, "zones": zones}
+    return signals
+
+def resample_frames(frames, granularity):
+    return {tf: {pair: RESAMPLER.frame(pair, granularity, tf, df) for pair, df in frames.items() if not df.empty}
+            for tf in higher_timeframes(granularity)}
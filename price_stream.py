@@ -0,0 +1,160 @@
+import json
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from time import monotonic
+
+import pandas as pd
+
+from oanda import config, SESSION, REQUEST_TIMEOUT
+from scheduler import aligned_start
+from signal_cache import GRANULARITY_SECONDS
+from trading_strategy import STORE, SIGNAL_CACHE, get_all_signals, get_pair_signal
+
+STREAM_URL = "https://stream-fxpractice.oanda.com/v3"
+# OANDA sends a heartbeat every 5 seconds; a silent connection for longer than this is treated as dead.
+HEARTBEAT_TIMEOUT = float(config.get("stream_heartbeat_timeout", 15))
+MAX_RECONNECT_DELAY = 60
+
+class CandleBuilder:
+    # Builds mid-price bars per pair from ticks. Bars are aligned as OANDA aligns its candles (UTC up
+    # to H1, 17:00 New York above it, Friday 17:00 for weekly) and close on the first tick or
+    # heartbeat past their end.
+    def __init__(self, granularity):
+        self.granularity = granularity
+        self.period = GRANULARITY_SECONDS[granularity]
+        self.bars = {}
+
+    def start(self, when):
+        if self.period <= 3600:
+            return when - when % self.period
+        return aligned_start(self.granularity, datetime.fromtimestamp(when, timezone.utc)).timestamp()
+
+    def tick(self, pair, when, price):
+        start = self.start(when)
+        bar = self.bars.get(pair)
+        if bar is not None and start <= bar[0]:
+            if start == bar[0]:
+                bar[2] = max(bar[2], price)
+                bar[3] = min(bar[3], price)
+                bar[4] = price
+            return None
+        self.bars[pair] = [start, price, price, price, price]
+        return bar
+
+    def advance(self, when):
+        start = self.start(when)
+        closed = [(pair, bar) for pair, bar in self.bars.items() if bar[0] < start]
+        for pair, _ in closed:
+            del self.bars[pair]
+        return closed
+
+def evaluate_bar(pair, granularity, bar, resync=False):
+    time = pd.Timestamp(bar[0], unit="s", tz="UTC")
+    if resync:
+        # The first bar after a (re)connect is partial and earlier bars may have been missed,
+        # so backfill from REST instead of trusting the locally built bar.
+        STORE.get(pair, granularity)
+    else:
+        STORE.apply_bar(pair, granularity, time, *bar[1:])
+    SIGNAL_CACHE.invalidate(pair, granularity)
+    return SIGNAL_CACHE.get(pair, granularity, lambda p: get_pair_signal(p, granularity, refresh=False))
+
+class PriceStream:
+    # One long-lived pricing stream for all pairs. Each closed bar is applied to the candle store and
+    # its signal re-evaluated immediately; latency is measured from receiving the closing message.
+    def __init__(self, pairs, granularity, on_signal=None, heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        self.pairs = list(pairs)
+        self.granularity = granularity
+        self.on_signal = on_signal
+        self.heartbeat_timeout = heartbeat_timeout
+        self.builder = CandleBuilder(granularity)
+        self.latencies = deque(maxlen=1000)
+        self.reconnects = 0
+        self.bars_closed = 0
+        self.last_message = None
+        self._resync = set()
+        self._response = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def url(self):
+        return f"{STREAM_URL}/accounts/{config['oanda_account_id']}/pricing/stream"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="price-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        response = self._response
+        if response is not None:
+            response.close()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def run(self):
+        get_all_signals(self.pairs, self.granularity)
+        delay = 1
+        while not self._stopped.is_set():
+            self._resync.update(self.pairs)
+            try:
+                self._consume()
+                delay = 1
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                print(f"Price stream error: {e}")
+            if self._stopped.is_set():
+                break
+            self.reconnects += 1
+            self._stopped.wait(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _consume(self):
+        params = {"instruments": ",".join(self.pairs)}
+        headers = {"Accept-Datetime-Format": "UNIX"}
+        timeout = (REQUEST_TIMEOUT, self.heartbeat_timeout)
+        with SESSION.get(self.url(), params=params, headers=headers, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            self._response = response
+            try:
+                # chunk_size=None hands over each chunk as it arrives instead of waiting to fill a buffer.
+                for line in response.iter_lines(chunk_size=None):
+                    if self._stopped.is_set():
+                        return
+                    if line:
+                        self.handle(json.loads(line), monotonic())
+            finally:
+                self._response = None
+
+    def handle(self, message, received):
+        self.last_message = received
+        when = float(message["time"])
+        if message.get("type") == "PRICE":
+            if not message.get("bids") or not message.get("asks"):
+                return
+            price = (float(message["bids"][0]["price"]) + float(message["asks"][0]["price"])) / 2
+            bar = self.builder.tick(message["instrument"], when, price)
+            if bar is not None:
+                self._close(message["instrument"], bar, received)
+        elif message.get("type") == "HEARTBEAT":
+            for pair, bar in self.builder.advance(when):
+                self._close(pair, bar, received)
+
+    def _close(self, pair, bar, received):
+        resync = pair in self._resync
+        self._resync.discard(pair)
+        signal = evaluate_bar(pair, self.granularity, bar, resync)
+        self.bars_closed += 1
+        self.latencies.append(monotonic() - received)
+        if signal is not None and self.on_signal is not None:
+            self.on_signal(pair, signal)
+
+    def latency_stats(self):
+        values = sorted(self.latencies)
+        if not values:
+            return {}
+        return {"count": len(values), "p50_ms": values[len(values) // 2] * 1000,
+                "p99_ms": values[int(len(values) * 0.99)] * 1000, "max_ms": values[-1] * 1000}
@@ -0,0 +1,140 @@
+# Reference implementations the optimized code is checked against: the previous per-candle parser and
+# string detectors, and pandas correlations.
+import numpy as np
+import pandas as pd
+
+
+def legacy_parse_candles(candles):
+    df = pd.DataFrame([{
+        "time": candle["time"],
+        "open": float(candle["mid"]["o"]),
+        "high": float(candle["mid"]["h"]),
+        "low": float(candle["mid"]["l"]),
+        "close": float(candle["mid"]["c"])
+    } for candle in candles])
+    df["time"] = pd.to_datetime(df["time"])
+    df.set_index("time", inplace=True)
+    complete = [candle.get("complete", True) for candle in candles]
+    last_complete = df.index[max(i for i, done in enumerate(complete) if done)] if any(complete) else None
+    return df[["open", "high", "low", "close"]], last_complete
+
+
+def legacy_detect_candlestick_patterns(df):
+    if df.empty or len(df) < 2:
+        return "No pattern"
+    latest = df.iloc[-1]
+    prev = df.iloc[-2]
+    body = abs(latest["close"] - latest["open"])
+    upper_wick = latest["high"] - max(latest["open"], latest["close"])
+    lower_wick = min(latest["open"], latest["close"]) - latest["low"]
+    range_size = latest["high"] - latest["low"] or 0.0001
+    
+    if upper_wick > 2 * body and lower_wick < body and range_size > df["range"].mean():
+        return "Bearish Pin Bar" if latest["close"] < latest["open"] else "Bullish Pin Bar"
+    if lower_wick > 2 * body and upper_wick < body and range_size > df["range"].mean():
+        return "Bullish Pin Bar" if latest["close"] > latest["open"] else "Bearish Pin Bar"
+    
+    prev_body = abs(prev["close"] - prev["open"])
+    if body > prev_body and latest["close"] > latest["open"] and prev["close"] < prev["open"]:
+        return "Bullish Engulfing"
+    if body > prev_body and latest["close"] < latest["open"] and prev["close"] > prev["open"]:
+        return "Bearish Engulfing"
+    
+    return "No pattern"
+
+
+def legacy_detect_key_levels(df):
+    if df.empty or len(df) < 20:
+        return None, None
+    resistance = df["high"].rolling(window=20).max().iloc[-1]
+    support = df["low"].rolling(window=20).min().iloc[-1]
+    return support, resistance
+
+
+def legacy_detect_breakout(df, levels):
+    if df.empty or len(df) < 3:
+        return "No breakout"
+    latest = df.iloc[-1]
+    prev = df.iloc[-2]
+    support, resistance = levels
+    if prev["close"] < resistance and latest["close"] > resistance and (latest["close"] - resistance) > latest["range"] * 0.3:
+        return f"Breakout above {resistance:.5f}"
+    if prev["close"] > support and latest["close"] < support and (support - latest["close"]) > latest["range"] * 0.3:
+        return f"Breakout below {support:.5f}"
+    return "No breakout"
+
+
+def legacy_detect_market_structure(df):
+    if df.empty or len(df) < 5:
+        return "Unknown"
+    df["swing_high"] = df["high"].rolling(window=5, center=True).max()
+    df["swing_low"] = df["low"].rolling(window=5, center=True).min()
+    highs = df["swing_high"].dropna()
+    lows = df["swing_low"].dropna()
+    if len(highs) < 2 or len(lows) < 2:
+        return "Limited data"
+    latest_high, prev_high = highs.iloc[-1], highs.iloc[-2]
+    latest_low, prev_low = lows.iloc[-1], lows.iloc[-2]
+    if latest_high > prev_high and latest_low > prev_low:
+        return "Bullish (HH, HL)"
+    if latest_high < prev_high and latest_low < prev_low:
+        return "Bearish (LH, LL)"
+    return "Consolidation"
+
+
+def legacy_detect_order_blocks(df):
+    if df.empty or len(df) < 3:
+        return "No OB"
+    df["range"] = df["high"] - df["low"]
+    small_range = df["range"] < df["range"].mean() * 0.5
+    reversal = df["close"].diff().shift(-1).abs() > df["range"].mean()
+    ob = small_range & reversal
+    if ob.iloc[-2]:
+        return f"OB at {df['close'].iloc[-2]:.5f}"
+    return "No recent OB"
+
+
+def legacy_detect_liquidity_zones(df):
+    if df.empty or len(df) < 5:
+        return "No LZ"
+    latest_high = df["swing_high"].iloc[-1]
+    latest_low = df["swing_low"].iloc[-1]
+    price = df["close"].iloc[-1]
+    if pd.isna([latest_high, latest_low, price]).any():
+        return "No LZ"
+    if abs(price - latest_high) < df["range"].mean() * 0.5:
+        return f"LZ above at {latest_high:.5f}"
+    if abs(price - latest_low) < df["range"].mean() * 0.5:
+        return f"LZ below at {latest_low:.5f}"
+    return "No LZ"
+
+
+def legacy_detect_fair_value_gaps(df):
+    if df.empty or len(df) < 3:
+        return "No FVG"
+    gap = df["high"].shift(1) - df["low"]
+    if gap.iloc[-2] > df["range"].mean() * 1.5:
+        return f"FVG at {df['high'].iloc[-3]:.5f}-{df['low'].iloc[-2]:.5f}"
+    return "No FVG"
+
+
+def legacy_detect(df):
+    levels = legacy_detect_key_levels(df)
+    return {"pattern": legacy_detect_candlestick_patterns(df), "breakout": legacy_detect_breakout(df, levels),
+            "structure": legacy_detect_market_structure(df), "ob": legacy_detect_order_blocks(df),
+            "lz": legacy_detect_liquidity_zones(df), "fvg": legacy_detect_fair_value_gaps(df)}
+
+
+def reference_correlation(frames, until, window, min_bars, currencies):
+    # pandas over the same rows: each pair's own log returns aligned on every bar time up to `until`.
+    returns = pd.concat({pair: np.log(df["close"][df.index <= until]).diff() for pair, df in frames.items()}, axis=1, sort=True)
+    returns = returns.iloc[-window:]
+    corr = returns.corr(min_periods=min_bars).to_numpy()
+    move = np.where(returns.count().to_numpy() >= min_bars, returns.sum().to_numpy() * 100, np.nan)
+    strength = []
+    for currency in currencies:
+        moves = [sign * m for pair, m in zip(frames, move) if not np.isnan(m)
+                 for base, quote in [pair.split("_")] if base in currencies and quote in currencies
+                 for sign in [1 if base == currency else -1 if quote == currency else 0] if sign]
+        strength.append(np.mean(moves) if moves else np.nan)
+    return corr, np.array(strength)
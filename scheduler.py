@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from oanda import config, MAX_CONCURRENCY
+from signal_cache import GRANULARITY_SECONDS, NEW_YORK, next_close
+from trading_strategy import SIGNAL_CACHE
+
+# Instruments that trade through the weekend; forex closes Friday 17:00 and reopens Sunday 17:00 New York.
+ALWAYS_OPEN = set(config.get("always_open", ["BTC_USD"]))
+# Seconds after a close before evaluating, so OANDA has marked the bar complete, and the window
+# over which a close's requests are spread.
+CLOSE_DELAY = float(config.get("close_delay", 2))
+CLOSE_SPREAD = float(config.get("close_spread", 10))
+
+def _anchor(now, weekly=True):
+    # OANDA aligns candles above H1 to 17:00 New York, and weekly candles to Friday 17:00. Works on
+    # a plain datetime: day arithmetic on a pandas Timestamp is absolute and skips an hour over DST.
+    local = datetime.fromtimestamp(now.timestamp(), NEW_YORK)
+    anchor = local.replace(hour=17, minute=0, second=0, microsecond=0)
+    if weekly:
+        anchor -= timedelta(days=(local.weekday() - 4) % 7)
+    if anchor > local:
+        anchor -= timedelta(days=7 if weekly else 1)
+    return anchor.astimezone(timezone.utc)
+
+def market_open(pair, when):
+    if pair in ALWAYS_OPEN:
+        return True
+    local = when.astimezone(NEW_YORK)
+    weekday, hour = local.weekday(), local.hour
+    return not (weekday == 5 or (weekday == 4 and hour >= 17) or (weekday == 6 and hour < 17))
+
+def reopen_time(when):
+    local = when.astimezone(NEW_YORK)
+    sunday = (local + timedelta(days=(6 - local.weekday()) % 7)).replace(hour=17, minute=0, second=0, microsecond=0)
+    return sunday.astimezone(timezone.utc)
+
+def aligned_start(granularity, now):
+    # Start of the bar holding `now`, on OANDA's alignment. Anchoring on the latest 17:00 New York
+    # rather than a fixed UTC hour keeps daily and intraday bars aligned across DST changes.
+    period = timedelta(seconds=GRANULARITY_SECONDS[granularity])
+    if period > timedelta(hours=1):
+        anchor = _anchor(now, weekly=granularity == "W")
+    else:
+        anchor = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return anchor + (now - anchor) // period * period
+
+def aligned_close(granularity, now):
+    return aligned_start(granularity, now) + timedelta(seconds=GRANULARITY_SECONDS[granularity])
+
+def next_bar_close(pair, granularity, now, candle_time=None):
+    # The forming bar's own close when its start is known, otherwise the next aligned boundary; for
+    # forex, bars that would open while the market is shut are skipped to the first one after reopening.
+    close = next_close(candle_time, granularity) if candle_time is not None else None
+    if close is None or close <= now:
+        close = aligned_close(granularity, now)
+    start = close - timedelta(seconds=GRANULARITY_SECONDS[granularity])
+    if not market_open(pair, start):
+        close = aligned_close(granularity, reopen_time(start))
+    return close
+
+class CandleScheduler:
+    # Wakes at each candle close, re-evaluates only the pairs whose bar just closed (in chunks spread
+    # over CLOSE_SPREAD seconds) and publishes only signals that changed since the last close.
+    def __init__(self, pairs, granularity, evaluate, publish, delay=CLOSE_DELAY, spread=CLOSE_SPREAD,
+                 clock=None, sleep=asyncio.sleep):
+        self.pairs = list(pairs)
+        self.granularity = granularity
+        self.evaluate = evaluate
+        self.publish = publish
+        self.delay = delay
+        self.spread = spread
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.sleep = sleep
+        self.last = {}
+        self.closes = 0
+        self.evaluations = 0
+        self.published = 0
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def plan(self, now):
+        closes = {pair: next_bar_close(pair, self.granularity, now, SIGNAL_CACHE.candle_time(pair, self.granularity))
+                  for pair in self.pairs}
+        close = min(closes.values())
+        return close, [pair for pair, time in closes.items() if time == close]
+
+    async def _sleep_until(self, when):
+        delay = (when - self.clock()).total_seconds()
+        if delay > 0:
+            await self.sleep(delay)
+
+    async def run(self):
+        while True:
+            try:
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Scheduler error: {e}")
+                await self.sleep(self.delay)
+
+    async def step(self):
+        close, due = self.plan(self.clock())
+        chunks = [due[i:i + MAX_CONCURRENCY] for i in range(0, len(due), MAX_CONCURRENCY)]
+        signals = {}
+        for k, chunk in enumerate(chunks):
+            await self._sleep_until(close + timedelta(seconds=self.delay + self.spread * k / len(chunks)))
+            for pair in chunk:
+                # A signal computed just before the close can still be inside the cache's minimum TTL.
+                SIGNAL_CACHE.invalidate(pair, self.granularity)
+            signals.update(await self.evaluate(chunk, self.granularity))
+        self.closes += 1
+        self.evaluations += len(due)
+        changed = self.changes(signals)
+        if changed:
+            await self.publish(changed)
+        return close, due, changed
+
+    def changes(self, signals):
+        # Signals that differ from the last one seen for their pair. Closes evaluated elsewhere (the
+        # price stream) are passed through here too, so a close seen by both is published once.
+        changed = {pair: data for pair, data in signals.items() if data["signal"] != self.last.get(pair, "HOLD")}
+        self.last.update({pair: data["signal"] for pair, data in signals.items()})
+        self.published += len(changed)
+        return changed
@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+GRANULARITY_SECONDS = {
+    "S5": 5, "S10": 10, "S15": 15, "S30": 30,
+    "M1": 60, "M2": 120, "M4": 240, "M5": 300, "M10": 600, "M15": 900, "M30": 1800,
+    "H1": 3600, "H2": 7200, "H3": 10800, "H4": 14400, "H6": 21600, "H8": 28800, "H12": 43200,
+    "D": 86400, "W": 604800,
+}
+# OANDA aligns candles above H1 to 17:00 in this zone.
+NEW_YORK = ZoneInfo("America/New_York")
+
+def next_close(candle_time, granularity):
+    return candle_time + timedelta(seconds=GRANULARITY_SECONDS.get(granularity, 3600))
+
+class SignalCache:
+    # Signals keyed by (pair, granularity, last candle time), valid until that candle closes.
+    # Concurrent requests for a key that is being computed wait on the same result.
+    def __init__(self, min_ttl=30):
+        self.min_ttl = timedelta(seconds=min_ttl)
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, pair, granularity, compute):
+        return self.get_many([pair], granularity, lambda pairs: {pair: compute(pair)}).get(pair)
+
+    def get_many(self, pairs, granularity, compute_many):
+        now = datetime.now(timezone.utc)
+        results, waiting, claimed = {}, {}, {}
+        with self._lock:
+            for pair in pairs:
+                key = (pair, granularity)
+                entry = self._entries.get(key)
+                if entry is not None and now < entry[1]:
+                    self.hits += 1
+                    results[pair] = entry[2]
+                elif key in self._inflight:
+                    self.merged += 1
+                    waiting[pair] = self._inflight[key]
+                else:
+                    self.misses += 1
+                    claimed[pair] = self._inflight[key] = Future()
+        if claimed:
+            try:
+                computed = compute_many(list(claimed))
+            except Exception as e:
+                with self._lock:
+                    for pair, future in claimed.items():
+                        self._inflight.pop((pair, granularity), None)
+                        future.set_exception(e)
+                raise
+            with self._lock:
+                for pair, future in claimed.items():
+                    value = computed.get(pair)
+                    if value is not None and not value["df"].empty:
+                        candle_time = value["df"].index[-1]
+                        expires = max(next_close(candle_time, granularity), now + self.min_ttl)
+                        self._entries[(pair, granularity)] = (candle_time, expires, value)
+                    self._inflight.pop((pair, granularity), None)
+                    future.set_result(value)
+                    results[pair] = value
+        for pair, future in waiting.items():
+            results[pair] = future.result()
+        return {pair: results[pair] for pair in pairs if results.get(pair) is not None}
+
+    def invalidate(self, pair, granularity):
+        with self._lock:
+            self._entries.pop((pair, granularity), None)
+
+    def candle_time(self, pair, granularity):
+        entry = self._entries.get((pair, granularity))
+        return entry[0] if entry else None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses + self.merged
+            return {"hits": self.hits, "misses": self.misses, "merged": self.merged,
+                    "entries": len(self._entries), "hit_rate": (self.hits + self.merged) / total if total else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,340 @@
+# Stub OANDA server, stub candle data and the delivery simulator shared by benchmark.py and the tests.
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, perf_counter, sleep
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from delivery import FanOut, SendQueue, Subscriptions, parse_targets
+from trading_strategy import MAJOR_CURRENCIES, PAIRS
+
+STUB_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def stub_series(pair, length=20000):
+    rng = np.random.default_rng(sum(map(ord, pair)))
+    close = 1.1 + np.cumsum(rng.normal(0, 0.001, length))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    high = np.maximum(open_, close) + rng.uniform(0, 0.001, length)
+    low = np.minimum(open_, close) - rng.uniform(0, 0.001, length)
+    return open_, high, low, close
+
+
+def stub_candles(pair, start, end, granularity="H1", series=None):
+    open_, high, low, close = series if series is not None else stub_series(pair)
+    candles = []
+    for i in range(max(start, 0), end):
+        mid = {"o": f"{open_[i]:.5f}", "h": f"{high[i]:.5f}", "l": f"{low[i]:.5f}", "c": f"{close[i]:.5f}"}
+        bid = {k: f"{float(v) - 0.00005:.5f}" for k, v in mid.items()}
+        ask = {k: f"{float(v) + 0.00005:.5f}" for k, v in mid.items()}
+        time = (STUB_START + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%S.000000000Z")
+        candles.append({"complete": i < end - 1, "volume": 100, "time": time, "mid": mid, "bid": bid, "ask": ask})
+    return {"instrument": pair, "granularity": granularity, "candles": candles}
+
+
+class StubOanda(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, rate_limit_every=0, bars=1000):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.bars = bars
+        self.stream_time = (STUB_START + timedelta(hours=bars - 1)).timestamp()
+        self.stream_step = 60.0
+        self.stream_rounds = 0
+        self.stream_interval = 0.002
+        self.stream_drop_after = 0
+        self.stream_connections = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.order_latency = 0.0
+        self.order_error_every = 0
+        self.order_hang_every = 0
+        self.order_hang = 0.0
+        self.order_posts = 0
+        self.orders = {}
+        self.fills = {}
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def pair_series(self, pair):
+        with self.lock:
+            if pair not in self.series:
+                self.series[pair] = stub_series(pair)
+            return self.series[pair]
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v3"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        # Counted before sending, so a client that has the response also sees it counted.
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if "/orders/@" in self.path:
+            self.order_lookup(self.path.split("/orders/@", 1)[1])
+            return
+        with server.lock:
+            server.requests += 1
+            limited = server.rate_limit_every and server.requests % server.rate_limit_every == 0
+        sleep(server.latency)
+        if limited:
+            self.send_json(429, {"errorMessage": "Rate limited"}, {"Retry-After": "0.05"})
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.endswith("/pricing/stream"):
+            self.stream(query["instruments"][0].split(","))
+            return
+        pair = url.path.split("/")[3]
+        count = int(query.get("count", ["500"])[0])
+        # REST history keeps up with the simulated pricing stream when one is running.
+        end = max(server.bars, int((server.stream_time - STUB_START.timestamp()) // 3600) + 1)
+        start = end - count
+        if "from" in query:
+            since = datetime.fromisoformat(query["from"][0].replace("Z", "+00:00"))
+            start = int((since - STUB_START).total_seconds() // 3600)
+            end = min(end, start + count)
+        granularity = query.get("granularity", ["H1"])[0]
+        self.send_json(200, stub_candles(pair, start, end, granularity, server.pair_series(pair)))
+
+
+    def do_POST(self):
+        # Mock order endpoint following OANDA's client ID rules: a repeated clientExtensions id is
+        # rejected as CLIENT_ORDER_ID_ALREADY_EXISTS only while that order is pending; MARKET orders
+        # fill at once, so a repeat fills again (counted in fills). Every order_error_every-th POST
+        # fails with a 503 before filling; every order_hang_every-th new order fills but answers only
+        # after order_hang seconds.
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        client_id = body["order"]["clientExtensions"]["id"]
+        sleep(server.order_latency)
+        with server.lock:
+            server.order_posts += 1
+            known = server.orders.get(client_id)
+            if known is not None and known["state"] == "PENDING":
+                outcome = "duplicate"
+            elif server.order_error_every and server.order_posts % server.order_error_every == 0:
+                outcome = "error"
+            else:
+                state = "FILLED" if body["order"]["type"] == "MARKET" else "PENDING"
+                server.orders[client_id] = dict(body["order"], id=str(len(server.orders) + 1), state=state)
+                server.fills[client_id] = server.fills.get(client_id, 0) + (state == "FILLED")
+                hang = known is None and server.order_hang_every and len(server.orders) % server.order_hang_every == 0
+                outcome = "hang" if hang else "filled"
+        try:
+            if outcome == "duplicate":
+                self.send_json(400, {"errorCode": "CLIENT_ORDER_ID_ALREADY_EXISTS", "errorMessage": "Client order ID exists"})
+            elif outcome == "error":
+                self.send_json(503, {"errorMessage": "Service unavailable"})
+            else:
+                if outcome == "hang":
+                    sleep(server.order_hang)
+                self.send_json(201, {"orderCreateTransaction": {"id": server.orders[client_id]["id"], "clientExtensions": {"id": client_id}},
+                                     "orderFillTransaction": {"instrument": body["order"]["instrument"], "units": body["order"]["units"]}})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def order_lookup(self, client_id):
+        with self.server.lock:
+            order = self.server.orders.get(client_id)
+        if order is None:
+            self.send_json(404, {"errorCode": "ORDER_DOESNT_EXIST", "errorMessage": "Order not found"})
+        else:
+            self.send_json(200, {"order": order})
+
+    def stream(self, pairs):
+        # Simulated pricing stream: every round emits one tick per pair and advances simulated time by
+        # stream_step seconds, with a heartbeat every fifth round. The first connection is dropped after
+        # stream_drop_after messages to exercise reconnects.
+        server = self.server
+        with server.lock:
+            server.stream_connections += 1
+            drop_after = server.stream_drop_after if server.stream_connections == 1 else 0
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.close_connection = True
+        sent = 0
+        try:
+            while server.stream_rounds > 0:
+                with server.lock:
+                    server.stream_rounds -= 1
+                    server.stream_time += server.stream_step
+                    now = server.stream_time
+                messages = []
+                for pair in pairs:
+                    price = float(server.pair_series(pair)[3][int(now // 3600) % 20000])
+                    price += np.sin(now / 97.0 + len(pair)) * 0.0005
+                    messages.append({"type": "PRICE", "instrument": pair, "time": f"{now:.9f}",
+                                     "bids": [{"price": f"{price - 0.00005:.5f}", "liquidity": 1000000}],
+                                     "asks": [{"price": f"{price + 0.00005:.5f}", "liquidity": 1000000}]})
+                if int(now / server.stream_step) % 5 == 0:
+                    messages.append({"type": "HEARTBEAT", "time": f"{now:.9f}"})
+                chunk = b"".join(json.dumps(m).encode() + b"\n" for m in messages)
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+                sent += len(messages)
+                if drop_after and sent >= drop_after:
+                    return
+                sleep(server.stream_interval)
+            sleep(0.2)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def stub_frame(pair, bars, start=0):
+    open_, high, low, close = (column[start:start + bars] for column in stub_series(pair))
+    index = pd.date_range(STUB_START + timedelta(hours=start), periods=bars, freq="h")
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close}, index=index)
+
+
+def currency_frames(pairs, bars, seed=7):
+    # Pair closes driven by shared currency factors, so correlations have real structure. Forex
+    # pairs skip the weekend and drop the odd bar; BTC_USD prints every hour.
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(STUB_START, periods=bars, freq="h")
+    factors = {c: np.cumsum(rng.normal(0, 0.001, bars)) for c in MAJOR_CURRENCIES + ["BTC"]}
+    factors["BTC"] = np.cumsum(rng.normal(0, 0.01, bars))
+    local = index.tz_convert("America/New_York")
+    weekend = (local.weekday == 5) | ((local.weekday == 4) & (local.hour >= 17)) | ((local.weekday == 6) & (local.hour < 17))
+    frames = {}
+    for pair in pairs:
+        base, quote = pair.split("_")
+        close = np.exp(factors[base] - factors[quote] + rng.normal(0, 0.0003, bars))
+        keep = np.ones(bars, dtype=bool) if base == "BTC" else ~weekend & (rng.random(bars) > 0.02)
+        frames[pair] = pd.DataFrame({"close": close[keep]}, index=index[keep])
+    return frames
+
+
+class FakeClock:
+    # Clock and sleep for CandleScheduler: sleeping moves the time on at once and, with a server,
+    # grows its history to the bar holding the new time.
+    def __init__(self, now, server=None):
+        self.now = now
+        self.server = server
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += timedelta(seconds=seconds)
+        if self.server is not None:
+            self.server.bars = int((self.now - STUB_START).total_seconds() // 3600) + 1
+        await asyncio.sleep(0)
+
+
+class RetryLater(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"retry after {retry_after} s")
+        self.retry_after = retry_after
+
+
+async def simulate_delivery(count, rate, interval, latency=0.002, fail_every=50):
+    # Two closes fanned out to `count` mock subscribers through one send queue per platform. Returns
+    # what each chat should end on, what it received, and every send's (time, platform, chat).
+    pairs = PAIRS
+    rng = np.random.default_rng(count)
+    subscriptions = Subscriptions(path=None)
+    for i in range(count):
+        platform = "discord" if i % 100 == 0 else "telegram"
+        words = list(rng.choice(pairs + ["EUR", "USD", "GBP", "JPY"], size=rng.integers(1, 4), replace=False))
+        words.append(str(rng.choice([0, 65, 80])))
+        if rng.random() < 0.1:
+            words.append("compare")
+        subscriptions.subscribe(platform, i, *parse_targets(words, pairs), save=False)
+    received, sends = {}, []
+
+    def sender(platform):
+        async def send(chat, message):
+            sends.append((monotonic(), platform, chat))
+            if len(sends) % fail_every == 0:
+                raise RetryLater(interval * 2)
+            await asyncio.sleep(latency)
+            received.setdefault(chat, []).append(message["text"])
+        return send
+
+    rendered = []
+
+    async def render(changed):
+        rendered.extend(changed)
+        return {pair: b"x" * 60000 for pair in changed}
+
+    async def compare():
+        rendered.append("comparison")
+        return b"x" * 80000, "comparison"
+
+    queues = {platform: SendQueue(sender(platform), rate, interval).start() for platform in ("telegram", "discord")}
+    fanout = FanOut(subscriptions, queues, render, lambda platform, pair, data: f"{pair} v{data['version']}", compare)
+    index = pd.DatetimeIndex([STUB_START], name="time")
+    expected = {}
+    start = perf_counter()
+    planning = 0.0
+    # Two closes in quick succession; pairs changing again replace their still-waiting messages.
+    for version, changed_pairs in enumerate((pairs[::3], pairs[::6])):
+        changed = {pair: {"signal": "BUY", "confidence": float(rng.choice([0.5, 0.7, 0.85])), "df": pd.DataFrame(index=index),
+                          "version": version} for pair in changed_pairs}
+        began = perf_counter()
+        await fanout.publish(changed)
+        planning += perf_counter() - began
+        for pair, data in changed.items():
+            for platform, chat in subscriptions.matching(pair, data):
+                expected.setdefault(chat, {})[pair] = version
+        for platform, chat in subscriptions.comparison():
+            expected.setdefault(chat, {})["comparison"] = version
+    for queue in queues.values():
+        await queue.join()
+    wall = perf_counter() - start
+    for queue in queues.values():
+        await queue.stop()
+    return {"expected": expected, "received": received, "sends": sends, "rendered": rendered, "planning": planning,
+            "wall": wall, "stats": {platform: queue.stats() for platform, queue in queues.items()}}
+
+
+def send_spacing(sends):
+    # The most sends one platform made in any one-second window, and the closest two sends to one chat.
+    times = np.array([t for t, _, _ in sends])
+    platforms = np.array([platform for _, platform, _ in sends])
+    chats = np.array([chat for _, _, chat in sends])
+    gaps = [np.diff(np.sort(times[chats == chat])) for chat in np.unique(chats)]
+    gap = min((g.min() for g in gaps if len(g)), default=float("inf"))
+    busiest = 0
+    for platform in np.unique(platforms):
+        sent_at = np.sort(times[platforms == platform])
+        busiest = max(busiest, int(max(np.searchsorted(sent_at, sent_at + 1.0) - np.arange(len(sent_at)))))
+    return busiest, gap
@@ -0,0 +1,36 @@
+import numpy as np
+
+import backtest
+import trading_strategy
+from candle_archive import CandleArchive
+from reference import legacy_detect_candlestick_patterns, legacy_detect_market_structure
+from stubs import stub_frame
+
+# The confluence rules fire about once per 7000 stub bars, so many pairs are needed for the rules
+# to be exercised on a meaningful number of entries.
+PAIRS = [f"P{i:03d}_USD" for i in range(100)]
+BARS = 8000
+SAMPLES = 3
+
+
+def test_vectorized_rules_match_generate_signal(tmp_path):
+    archive = CandleArchive(str(tmp_path))
+    rng = np.random.default_rng(0)
+    entries = 0
+    for pair in PAIRS:
+        df = stub_frame(pair, BARS)
+        archive.append(pair, "H1", df)
+        f = backtest.load_features(pair, "H1", str(tmp_path))
+        side = backtest.signals(f, backtest.DEFAULT_PARAMS)
+        entries += int(np.count_nonzero(side))
+        checks = set(np.flatnonzero(side)) | set(rng.integers(backtest.WINDOW, BARS, SAMPLES))
+        for i in sorted(i for i in checks if i >= backtest.WINDOW - 1):
+            window = df.iloc[i - backtest.WINDOW + 1:i + 1].copy()
+            expected = trading_strategy.generate_signal(window)[0]
+            got = {1: "BUY", -1: "SELL", 0: "HOLD"}[int(side[i])]
+            assert got == expected, f"{pair} bar {i}: vectorized {got}, generate_signal {expected}"
+            # The signal is almost always HOLD, so also check the structure/pattern inputs it is built from.
+            window = trading_strategy.calculate_indicators(window)
+            labels = legacy_detect_market_structure(window) + legacy_detect_candlestick_patterns(window)
+            assert f["bullish"][i] == ("Bullish" in labels) and f["bearish"][i] == ("Bearish" in labels), f"{pair} bar {i}: {labels}"
+    assert entries >= 50, f"only {entries} entries"
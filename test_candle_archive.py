@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from candle_archive import CandleArchive
+from candle_store import CandleStore
+from stubs import STUB_START, stub_frame
+
+OHLC = ["open", "high", "low", "close"]
+
+
+@pytest.mark.parametrize("gap", [0, 50])
+def test_warm_restart_matches_refetch(server, tmp_path, gap):
+    archive = CandleArchive(str(tmp_path))
+    CandleStore(archive=archive).get("EUR_USD", "H1")
+    server.bars += gap
+    requests, sent = server.requests, server.bytes_sent
+    warm = CandleStore(archive=archive).get("EUR_USD", "H1")
+    warm_requests, warm_bytes = server.requests - requests, server.bytes_sent - sent
+    sent = server.bytes_sent
+    cold = CandleStore().get("EUR_USD", "H1")
+    assert warm.index.equals(cold.index)
+    assert (warm[OHLC].values == cold[OHLC].values).all()
+    assert warm.attrs["last_complete"] == cold.attrs["last_complete"]
+    # Only the gap is fetched.
+    assert warm_requests == 1 and warm_bytes * 5 < server.bytes_sent - sent
+
+
+def test_gap_wider_than_window_is_paged(server, tmp_path):
+    archive = CandleArchive(str(tmp_path))
+    CandleStore(archive=archive).get("EUR_USD", "H1")
+    server.bars += 1200
+    df = CandleStore(archive=archive).get("EUR_USD", "H1")
+    times = archive.times("EUR_USD", "H1")
+    assert len(times) == 499 + 1200 and (np.diff(times) == 3600).all()
+    assert times[-1] == df.attrs["last_complete"].timestamp()
+
+
+def test_reads_match_appended_history(tmp_path):
+    archive = CandleArchive(str(tmp_path))
+    history = stub_frame("EUR_USD", 2000)
+    archive.append("EUR_USD", "H1", history.iloc[:1500])
+    # Overlapping rows are skipped, so pages can be appended as they come.
+    assert archive.append("EUR_USD", "H1", history.iloc[1000:]) == 500
+    latest = archive.read("EUR_USD", "H1", bars=500)
+    assert latest.index.equals(history.index[-500:]) and (latest.values == history[OHLC].values[-500:]).all()
+    start, end = STUB_START + timedelta(days=30), STUB_START + timedelta(days=60)
+    month = archive.read("EUR_USD", "H1", start, end)
+    expected = history[(history.index >= start) & (history.index <= end)]
+    assert month.index.equals(expected.index) and (month.values == expected[OHLC].values).all()
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pytest
+
+import trading_strategy
+from candle_store import CandleStore, parse_candles
+from reference import legacy_parse_candles
+from stubs import stub_candles
+
+OHLC = ["open", "high", "low", "close"]
+
+
+@pytest.mark.parametrize("count", [1, 2, 500, 5000])
+def test_parser_matches_legacy_parser(count):
+    # Through JSON, as the candles arrive; the last one is still forming.
+    candles = json.loads(json.dumps(stub_candles("EUR_USD", 0, count)))["candles"]
+    old, old_last = legacy_parse_candles(candles)
+    new, new_last = parse_candles(candles)
+    assert old.index.equals(new.index) and old_last == new_last
+    assert (old.values == new[OHLC].values).all()
+    assert np.allclose(new["spread"], 0.0001)
+
+
+def test_parser_without_bid_ask():
+    candles = stub_candles("EUR_USD", 0, 10)["candles"]
+    for candle in candles:
+        candle["complete"] = True
+        del candle["bid"], candle["ask"]
+    df, last_complete = parse_candles(candles)
+    assert list(df.columns) == OHLC and last_complete == df.index[-1]
+    assert parse_candles([])[1] is None
+
+
+@pytest.mark.parametrize("added", [0, 1, 5, 600])
+def test_incremental_refresh_matches_full_fetch(server, added):
+    # 600 new bars is a gap wider than the window, which without an archive means a full refetch.
+    store = CandleStore()
+    store.get("EUR_USD", "H1")
+    server.bars += added
+    sent = server.bytes_sent
+    incremental = store.get("EUR_USD", "H1")
+    incremental_bytes = server.bytes_sent - sent
+    sent = server.bytes_sent
+    full = trading_strategy.fetch_data("EUR_USD", "H1")
+    full_bytes = server.bytes_sent - sent
+    assert incremental.index.equals(full.index)
+    assert (incremental[OHLC].values == full[OHLC].values).all()
+    assert incremental.attrs["last_complete"] == full.index[-2]
+    if added <= 5:
+        assert incremental_bytes * 10 < full_bytes
+
+
+def test_stream_bar_is_replaced_by_rest(server):
+    store = CandleStore()
+    df = store.get("EUR_USD", "H1")
+    # The forming bar closes from the stream with values OANDA's own candle does not have.
+    time = df.index[-1]
+    store.apply_bar("EUR_USD", "H1", time, 1.0, 2.0, 0.5, 1.5)
+    assert store.get("EUR_USD", "H1", refresh=False).loc[time, "close"] == 1.5
+    server.bars += 1
+    refreshed = store.get("EUR_USD", "H1")
+    full = trading_strategy.fetch_data("EUR_USD", "H1")
+    assert (refreshed[OHLC].values == full[OHLC].values).all()
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import trading_strategy
+from correlation import CorrelationEngine
+from reference import reference_correlation
+from stubs import STUB_START, currency_frames
+
+HISTORY = 300
+CLOSES = 240
+WINDOW = 120
+
+
+def test_engine_matches_pandas_close_by_close():
+    pairs = trading_strategy.PAIRS
+    frames = currency_frames(pairs, HISTORY + CLOSES + 1)
+    engine = CorrelationEngine(pairs, "H1", trading_strategy.MAJOR_CURRENCIES, WINDOW)
+    late = "NZD_CAD"
+    checked = 0
+    for step in range(CLOSES):
+        now = STUB_START + timedelta(hours=HISTORY + step)
+        # Store-like frames: the last 500 bars with the forming bar after last_complete.
+        views = {}
+        for pair, df in frames.items():
+            view = df[df.index <= now + timedelta(hours=1)].iloc[-500:]
+            view.attrs["last_complete"] = view.index[view.index <= now][-1]
+            views[pair] = view
+        # Pairs arrive in two chunks, as the scheduler spreads them, and one pair only joins later.
+        joined = [pair for pair in pairs if pair != late or step >= CLOSES // 3]
+        for chunk in (pairs[:13], pairs[13:]):
+            engine.update({pair: views[pair] for pair in chunk if pair in joined})
+        if engine.committed is None:
+            continue
+        until = pd.Timestamp(engine.committed, unit="s", tz="UTC")
+        seen = {pair: frames[pair] for pair in joined}
+        corr, strength = reference_correlation(seen, until, WINDOW, engine.min_bars, engine.currencies)
+        snapshot = engine.snapshot()
+        columns = [pairs.index(pair) for pair in seen]
+        got = snapshot["correlation"][np.ix_(columns, columns)]
+        for a, b in ((got, corr), (snapshot["strength"], strength)):
+            assert (np.isnan(a) == np.isnan(b)).all(), f"NaN mismatch at {until}"
+            assert np.nanmax(np.abs(a - b), initial=0.0) < 1e-9, f"mismatch at {until}"
+        checked += 1
+    assert checked > CLOSES // 2
+    # The window was rebuilt along the way, not only updated incrementally.
+    assert engine.rebuilds > 1
@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import pytest
+
+from delivery import Subscriptions, parse_targets
+from stubs import send_spacing, simulate_delivery
+from trading_strategy import PAIRS
+
+# Limits scaled up so a run takes seconds: 600 messages per second per platform, 50 ms between
+# messages to one chat. A thousand subscribers keep the platform limit busy.
+SCALE = 20.0
+RATE, INTERVAL = 30.0 * SCALE, 1.0 / SCALE
+
+
+@pytest.mark.parametrize("count", [100, 1000])
+def test_fan_out_delivers_latest_signals_within_limits(count):
+    result = asyncio.run(simulate_delivery(count, RATE, INTERVAL))
+    received, expected = result["received"], result["expected"]
+    # Every subscriber ends on the latest version of each of its pairs; nothing else arrives.
+    for chat, wanted in expected.items():
+        latest = {}
+        for text in received.get(chat, []):
+            name, _, version = text.partition(" v")
+            latest[name] = int(version) if version else max(wanted.get("comparison", 0), latest.get(name, 0))
+        assert latest.keys() == wanted.keys(), f"chat {chat}: got {sorted(latest)}, wanted {sorted(wanted)}"
+        assert all(latest[name] == version for name, version in wanted.items() if name != "comparison"), f"chat {chat} got a stale signal"
+    assert set(received) <= set(expected)
+    # One render per changed pair and close, plus the comparison chart, however many subscribers.
+    assert len(result["rendered"]) <= len(PAIRS[::3]) + len(PAIRS[::6]) + 2
+    busiest, gap = send_spacing(result["sends"])
+    assert busiest <= RATE, "platform rate exceeded"
+    assert gap >= INTERVAL * 0.95, "per-chat pacing violated"
+
+
+@pytest.mark.parametrize("word", ["nan", "inf", "-inf%"])
+def test_non_finite_confidence_is_rejected(word):
+    with pytest.raises(ValueError):
+        parse_targets([word], PAIRS)
+
+
+def test_unsubscribed_seed_stays_unsubscribed(tmp_path):
+    path = str(tmp_path / "subscriptions.json")
+    subscriptions = Subscriptions(path)
+    assert subscriptions.seed("discord", 1, PAIRS, comparison=True) is not None
+    subscriptions.unsubscribe("discord", 1)
+    restarted = Subscriptions(path)
+    assert restarted.seed("discord", 1, PAIRS, comparison=True) is None
+    assert restarted.get("discord", 1) is None
+
+
+def test_list_file_still_loads(tmp_path):
+    path = tmp_path / "subscriptions.json"
+    path.write_text(json.dumps([{"platform": "telegram", "chat": 5, "pairs": ["EUR_USD"],
+                                 "min_confidence": 0.7, "comparison": False}]))
+    subscriptions = Subscriptions(str(path))
+    assert subscriptions.get("telegram", 5)["pairs"] == ["EUR_USD"]
+    assert subscriptions.seed("discord", 1, PAIRS) is not None
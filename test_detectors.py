@@ -0,0 +1,23 @@
+import numpy as np
+
+import detectors
+import trading_strategy
+from reference import legacy_detect
+from stubs import stub_frame
+
+BARS = 5000
+SAMPLES = 100
+
+
+def test_detector_pass_matches_string_detectors():
+    df = trading_strategy.calculate_indicators(stub_frame("P000_USD", BARS))
+    found = detectors.detect_frame(df)
+    # Bars with a detection, plus random ones.
+    flagged = np.flatnonzero((found["pattern"] != 0) | found["order_block"] | found["fvg"] | (found["structure"] != 0))
+    rng = np.random.default_rng(0)
+    checks = sorted(set(rng.choice(flagged[flagged >= 499], SAMPLES)) | set(rng.integers(499, BARS, SAMPLES)))
+    for i in checks:
+        window = df.iloc[i - 499:i + 1].copy()
+        expected = legacy_detect(window)
+        assert detectors.describe(detectors.at(detectors.detect_frame(window))) == expected, f"bar {i}"
+        assert detectors.describe(detectors.at(found, i)) == expected, f"bar {i}: full-history pass differs"
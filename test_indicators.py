@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import trading_strategy
+from indicators import COLUMNS, IndicatorEngine
+from stubs import stub_frame
+
+
+def check_indicator_parity(engine_frame, reference, rows=slice(None), tolerance=1e-9):
+    for column in COLUMNS:
+        a = engine_frame[column].to_numpy()[rows]
+        b = reference[column].to_numpy()[rows]
+        assert (np.isnan(a) == np.isnan(b)).all(), f"{column}: NaN mismatch"
+        mask = ~np.isnan(a)
+        scale = np.maximum(np.abs(b[mask]), 1.0)
+        worst = np.max(np.abs(a[mask] - b[mask]) / scale, initial=0.0)
+        assert worst < tolerance, f"{column}: relative error {worst:.2e}"
+
+
+@pytest.mark.parametrize("pair", ["EUR_USD", "USD_JPY", "BTC_USD"])
+@pytest.mark.parametrize("bars", [50, 60, 199, 200, 350, 500])
+def test_full_replay_matches_calculate_indicators(pair, bars):
+    df = stub_frame(pair, bars)
+    reference = trading_strategy.calculate_indicators(df.copy())
+    check_indicator_parity(IndicatorEngine().sync(df, df.index[-1]), reference)
+    # With the last bar still forming.
+    check_indicator_parity(IndicatorEngine().sync(df, df.index[-2]), reference)
+
+
+def test_rolling_window_matches_calculate_indicators():
+    # Stream a rolling 500-bar window forward bar by bar, with a forming bar on every step.
+    engine = IndicatorEngine()
+    for step in range(50):
+        df = stub_frame("EUR_USD", 500, start=step)
+        frame = engine.sync(df, df.index[-2])
+        reference = trading_strategy.calculate_indicators(df.copy())
+        check_indicator_parity(frame, reference, rows=slice(-2, None), tolerance=1e-7)
+
+
+def test_replaced_bar_is_replayed():
+    # A stream-built bar that REST later replaces keeps its time but not its values.
+    engine = IndicatorEngine()
+    df = stub_frame("EUR_USD", 300)
+    engine.sync(df, df.index[-1])
+    replaced = df.copy()
+    replaced.iloc[-3, replaced.columns.get_loc("close")] += 0.01
+    replaced.iloc[-3, replaced.columns.get_loc("high")] += 0.01
+    reference = trading_strategy.calculate_indicators(replaced.copy())
+    check_indicator_parity(engine.sync(replaced, replaced.index[-1]), reference)
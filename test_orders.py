@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+import trading_strategy
+from orders import OrderExecutor, order_request, send_order
+from stubs import stub_frame
+
+
+def test_lost_response_is_looked_up_not_reposted(server):
+    server.order_hang_every = 1
+    server.order_hang = 1.0
+    result = send_order(order_request("BUY", "EUR_USD", 1000, 1.0, 1.2, "fxbot-test-1"), timeout=0.2)
+    assert result == {"duplicate": True}
+    assert server.order_posts == 1 and server.fills == {"fxbot-test-1": 1}
+
+
+def test_failed_order_is_posted_again(server):
+    server.order_error_every = 1
+    with pytest.raises(Exception):
+        send_order(order_request("BUY", "EUR_USD", 1000, 1.0, 1.2, "fxbot-test-2"), timeout=0.2, retries=1)
+    assert server.order_posts == 2 and not server.fills
+    server.order_error_every = 2
+    send_order(order_request("BUY", "EUR_USD", 1000, 1.0, 1.2, "fxbot-test-3"), timeout=0.2)
+    assert server.fills == {"fxbot-test-3": 1}
+
+
+def candle_signals():
+    return {pair: {"signal": ("BUY", "SELL")[i % 2], "sl": 1.0, "tp": 1.2, "df": stub_frame(pair, 2)}
+            for i, pair in enumerate(trading_strategy.PAIRS)}
+
+
+async def execute(signals, **kwargs):
+    executor = OrderExecutor(**kwargs).start()
+    queued = await executor.submit_all(signals, "H1")
+    await executor.join()
+    # The same candle's signals served again (cache hit, second user) must not queue anything.
+    requeued = await executor.submit_all(signals, "H1")
+    await executor.stop()
+    return executor.stats(), queued, requeued
+
+
+@pytest.mark.parametrize("faults", [False, True])
+def test_executor_fills_each_order_once(server, faults):
+    pairs = trading_strategy.PAIRS
+    signals = candle_signals()
+    server.order_latency = 0.02
+    if faults:
+        # Injected 503s and responses lost after the order filled.
+        server.order_error_every, server.order_hang_every, server.order_hang = 7, 5, 0.9
+
+    stats, queued, requeued = asyncio.run(execute(signals, workers=8, timeout=0.3))
+    assert queued == len(pairs) and requeued == 0
+    assert stats["failed"] == 0 and stats["placed"] == len(pairs)
+    assert server.fills == {order["clientExtensions"]["id"]: 1 for order in server.orders.values()}
+    assert len(server.fills) == len(pairs)
+    if faults:
+        assert stats["recovered"] > 0
+
+
+def test_restarted_executor_does_not_fill_again(server):
+    # A restart mid-candle, or a second instance, starts with no memory of what was sent.
+    signals = candle_signals()
+    asyncio.run(execute(signals, workers=8, timeout=0.3))
+    posts = server.order_posts
+    stats, queued, _ = asyncio.run(execute(signals, workers=8, timeout=0.3))
+    assert queued == len(signals) and stats["recovered"] == len(signals)
+    assert server.order_posts == posts
+    assert set(server.fills.values()) == {1} and len(server.fills) == len(signals)
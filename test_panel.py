@@ -0,0 +1,18 @@
+import numpy as np
+
+import panel
+import trading_strategy
+from stubs import stub_frame
+
+
+def test_panel_matches_generate_signal():
+    # Mixed history lengths exercise the NaN padding and the short-history SMA200 fallback.
+    frames = {f"P{i:03d}_USD": stub_frame(f"P{i:03d}_USD", (40, 120, 500)[i % 3] if i < 6 else 500, start=i * 7)
+              for i in range(60)}
+    batch = panel.generate_signals(frames)
+    for pair, df in frames.items():
+        result = trading_strategy.generate_signal(df.copy())
+        got = batch[pair]
+        assert got["analysis"] == result[4], f"{pair}: {got['analysis']} != {result[4]}"
+        assert (got["signal"], got["recommendation"], got["confidence"]) == (result[0], result[5], result[6]), pair
+        assert np.allclose([got["strength"], got["sl"], got["tp"]], result[1:4], equal_nan=True), pair
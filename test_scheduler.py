@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import execution
+import trading_strategy
+from scheduler import CandleScheduler, aligned_start, market_open
+from stubs import STUB_START, FakeClock
+
+# A Friday 00:30 UTC start, so three days cross the Friday 22:00 UTC close and the Sunday reopen.
+BEGIN = STUB_START + timedelta(days=32, minutes=30)
+HOURS = 72
+
+
+async def run(scheduler, clock, end):
+    closes = []
+    while scheduler.plan(clock.now)[0] <= end:
+        close, due, changed = await scheduler.step()
+        closes.append((close, due))
+    return closes
+
+
+def test_each_open_close_is_evaluated_once(server):
+    pairs = trading_strategy.PAIRS
+    # History up to the bar holding BEGIN, grown by the clock; no stream running ahead of it.
+    server.bars = int((BEGIN - STUB_START).total_seconds() // 3600) + 1
+    server.stream_time = STUB_START.timestamp()
+    clock = FakeClock(BEGIN, server)
+    calls = []
+
+    async def evaluate(chunk, granularity):
+        calls.append(clock.now)
+        return execution.compute_all_signals(chunk, granularity)
+
+    async def publish(changed):
+        pass
+
+    scheduler = CandleScheduler(pairs, "H1", evaluate, publish, clock=clock, sleep=clock.sleep)
+    scheduler.last = {pair: data["signal"] for pair, data in execution.compute_all_signals(pairs, "H1").items()}
+    closes = asyncio.run(run(scheduler, clock, BEGIN + timedelta(hours=HOURS)))
+    evaluated = {(pair, close) for close, due in closes for pair in due}
+    hours = [BEGIN.replace(minute=0) + timedelta(hours=h) for h in range(1, HOURS + 1)]
+    # Forex only for bars that open while the market is; BTC_USD on every close.
+    expected = {(pair, close) for close in hours for pair in pairs if market_open(pair, close - timedelta(hours=1))}
+    assert evaluated == expected
+    # The first close's chunks are spread over the window after its delay.
+    close = closes[0][0]
+    first = [call for call in calls if call < close + timedelta(seconds=scheduler.delay + scheduler.spread)]
+    assert first and all(call >= close + timedelta(seconds=scheduler.delay) for call in first)
+
+
+def test_every_m5_close_is_evaluated_and_only_changes_are_published():
+    clock = FakeClock(BEGIN)
+    rng = np.random.default_rng(0)
+    seen, current, pushed = [], ["HOLD"], []
+
+    async def evaluate(chunk, granularity):
+        seen.append(clock.now)
+        if rng.random() < 0.1:
+            current[0] = str(rng.choice(["BUY", "SELL", "HOLD"]))
+        return {pair: {"signal": current[0]} for pair in chunk}
+
+    async def publish(changed):
+        pushed.append(changed["EUR_USD"]["signal"])
+
+    scheduler = CandleScheduler(["EUR_USD"], "M5", evaluate, publish, clock=clock, sleep=clock.sleep)
+    closes = [close for close, _ in asyncio.run(run(scheduler, clock, BEGIN + timedelta(hours=HOURS)))]
+    open_bars = sum(market_open("EUR_USD", BEGIN + timedelta(minutes=5 * i)) for i in range(HOURS * 12))
+    assert len(closes) == open_bars
+    # Each evaluation happens after its bar closed, not a bar later.
+    assert all(close <= seen_at < close + timedelta(minutes=5) for close, seen_at in zip(closes, seen))
+    assert pushed and all(a != b for a, b in zip(["HOLD"] + pushed, pushed))
+
+
+@pytest.mark.parametrize("granularity", ["H4", "D"])
+def test_aligned_start_follows_dst_for_timestamps(granularity):
+    # pandas Timestamps do absolute day arithmetic; bars must still start at 17:00 New York.
+    for hour in range(0, 48):
+        now = datetime(2024, 3, 9, tzinfo=timezone.utc) + timedelta(hours=hour)
+        assert aligned_start(granularity, pd.Timestamp(now)) == aligned_start(granularity, now)
+    assert aligned_start("D", datetime(2024, 3, 10, 20, tzinfo=timezone.utc)) == datetime(2024, 3, 9, 22, tzinfo=timezone.utc)
+    assert aligned_start("D", datetime(2024, 3, 10, 21, tzinfo=timezone.utc)) == datetime(2024, 3, 10, 21, tzinfo=timezone.utc)
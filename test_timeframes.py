@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import execution
+import trading_strategy
+from scheduler import aligned_start
+from stubs import stub_frame
+from timeframes import Resampler, higher_timeframes, resample
+
+# From 2024-01-01 across both of that year's DST changes (10 March and 3 November).
+FULL = stub_frame("EUR_USD", 8000)
+
+
+@pytest.mark.parametrize("tf", higher_timeframes("H1"))
+def test_resample_matches_scheduler_alignment(tf):
+    starts = [aligned_start(tf, time.to_pydatetime()) for time in FULL.index]
+    reference = FULL.groupby(starts).agg({"open": "first", "high": "max", "low": "min", "close": "last"})
+    got = resample(FULL, tf)
+    assert got.index.equals(pd.DatetimeIndex(reference.index).as_unit("ns"))
+    assert np.allclose(got.values, reference.values)
+
+
+@pytest.mark.parametrize("tf", higher_timeframes("H1"))
+def test_incremental_matches_rebuild(tf):
+    # Walk a 500-bar base window forward one bar at a time over the March DST change, with the
+    # last bar still forming, against a from-scratch resample of the same bars.
+    resampler = Resampler()
+    for end in range(1500, 1900):
+        window = FULL.iloc[end - 500:end + 1].copy()
+        window.iloc[-1, window.columns.get_loc("close")] = window["open"].iloc[-1]
+        window.attrs["last_complete"] = window.index[-2]
+        frame = resampler.frame("EUR_USD", "H1", tf, window)
+        scratch = resample(window, tf, window.index[-2], "H1")
+        tail = scratch.iloc[1:]
+        assert frame.iloc[-len(tail):].equals(tail), f"{tf} at bar {end}"
+        assert frame.attrs["last_complete"] == scratch.attrs["last_complete"], f"{tf} at bar {end}"
+
+
+def test_short_dst_day_closes_at_next_anchor():
+    # 10 March 2024 runs 23 hours from 17:00 New York: 22:00 UTC the day before to 21:00 UTC.
+    base = FULL[FULL.index < pd.Timestamp("2024-03-10 21:00", tz="UTC")]
+    day = resample(base, "D", base.index[-1], "H1")
+    assert day.index[-1] == pd.Timestamp("2024-03-09 22:00", tz="UTC")
+    assert day.attrs["last_complete"] == day.index[-1]
+    assert resample(base, "D", base.index[-2], "H1").attrs["last_complete"] == day.index[-2]
+
+
+def test_views_cost_no_requests_and_match_across_paths(server):
+    pairs = trading_strategy.PAIRS
+    views = {}
+    for label, fetch in (("per-pair", trading_strategy.get_all_signals), ("panel", execution.compute_all_signals)):
+        trading_strategy.STORE.clear()
+        trading_strategy.RESAMPLER.clear()
+        trading_strategy.SIGNAL_CACHE.clear()
+        requests = server.requests
+        signals = fetch(pairs, "H1")
+        assert server.requests - requests == len(pairs), f"{label}: higher timeframes added requests"
+        views[label] = {pair: (data["bias"], data["timeframes"]) for pair, data in signals.items()}
+    assert views["per-pair"] == views["panel"]
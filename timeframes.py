@@ -0,0 +1,156 @@
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from oanda import config
+from candle_store import MAX_BARS
+from signal_cache import GRANULARITY_SECONDS, NEW_YORK
+
+# Higher timeframes are built locally from the base granularity's candles, never fetched.
+TIMEFRAMES = config.get("timeframes", ["H4", "D"])
+REQUIRE_AGREEMENT = bool(config.get("timeframe_agreement", False))
+
+def higher_timeframes(granularity, timeframes=TIMEFRAMES):
+    # Only whole multiples of the base that tile the day from 17:00 New York can be built by
+    # bucketing base bars.
+    base = GRANULARITY_SECONDS[granularity]
+    return [tf for tf in timeframes
+            if GRANULARITY_SECONDS.get(tf, 0) > base and GRANULARITY_SECONDS[tf] % base == 0
+            and 86400 % GRANULARITY_SECONDS[tf] == 0]
+
+@lru_cache(maxsize=4096)
+def _anchor_on(day):
+    # Epoch seconds of 17:00 New York on the given epoch day (21:00 or 22:00 UTC the same day).
+    date = datetime.fromtimestamp(day * 86400, timezone.utc).date()
+    return int(datetime(date.year, date.month, date.day, 17, tzinfo=NEW_YORK).timestamp())
+
+def _anchor_seconds(days):
+    unique, inverse = np.unique(days, return_inverse=True)
+    return np.array([_anchor_on(int(day)) for day in unique], dtype=np.int64)[inverse]
+
+def _anchors(seconds, days=0):
+    # Epoch seconds of the latest 17:00 New York at or before each time, `days` later. Like
+    # scheduler.aligned_start, this follows DST.
+    day = seconds // 86400
+    day = np.where(_anchor_seconds(day) <= seconds, day, day - 1)
+    return _anchor_seconds(day + days)
+
+def _buckets(seconds, period):
+    # Bar starts on OANDA's alignment: epoch multiples up to H1, counted from 17:00 New York above.
+    if period <= 3600:
+        return seconds - seconds % period
+    anchors = _anchors(seconds)
+    return anchors + (seconds - anchors) // period * period
+
+def _bucket_ends(starts, period):
+    # The last bar of a 23- or 25-hour DST day ends at the next 17:00 New York, not a period later.
+    ends = starts + period
+    if period > 3600 and len(starts):
+        ends = np.minimum(ends, _anchors(starts, days=1))
+    return ends
+
+def _aggregate(seconds, open_, high, low, close, period):
+    buckets = _buckets(seconds, period)
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], len(seconds)) - 1
+    return (buckets[starts], open_[starts], np.maximum.reduceat(high, starts),
+            np.minimum.reduceat(low, starts), close[ends])
+
+def frame_arrays(df, columns=("open", "high", "low", "close")):
+    # Epoch seconds and the given columns as arrays. One to_numpy over the whole frame: per-column
+    # access deep-copies df.attrs every time.
+    values = df.to_numpy(dtype=float)[:, df.columns.get_indexer(list(columns))]
+    return (df.index.as_unit("s").asi8,) + tuple(values.T)
+
+def _frame(bars, last_complete):
+    index = pd.DatetimeIndex(bars[0].astype("datetime64[s]").astype("datetime64[ns]"), name="time").tz_localize("UTC")
+    df = pd.DataFrame(np.column_stack(bars[1:]), index=index, columns=["open", "high", "low", "close"])
+    df.attrs["last_complete"] = None if last_complete is None else index[last_complete]
+    return df
+
+def _last_complete(times, period, last_complete, base_granularity):
+    # A higher bar is complete once the base bar that ends it is.
+    if last_complete is None or not len(times):
+        return None
+    closed_until = int(pd.Timestamp(last_complete).timestamp()) + GRANULARITY_SECONDS[base_granularity]
+    count = int(np.searchsorted(_bucket_ends(times, period), closed_until, side="right"))
+    return count - 1 if count else None
+
+def resample(df, granularity, last_complete=None, base_granularity=None):
+    # Buckets are aligned like OANDA's own candles and the scheduler's closes (see _buckets).
+    if df.empty:
+        return pd.DataFrame(columns=["open", "high", "low", "close"])
+    period = GRANULARITY_SECONDS[granularity]
+    bars = _aggregate(*frame_arrays(df), period)
+    return _frame(bars, _last_complete(bars[0], period, last_complete, base_granularity))
+
+class Resampler:
+    # Higher-timeframe bars per (pair, base, target), kept as arrays. Each update re-aggregates only
+    # the base bars from the latest, possibly still forming, higher bar onwards. A rebuild prepends
+    # older base bars from the store's candle archive, so D or H4 frames get more history than the
+    # base window holds.
+    def __init__(self, store=None, max_bars=MAX_BARS):
+        self.store = store
+        self.max_bars = max_bars
+        self._bars = {}
+        self._lock = threading.Lock()
+
+    def frame(self, pair, base, target, df):
+        key = (pair, base, target)
+        period = GRANULARITY_SECONDS[target]
+        if df.empty:
+            return resample(df, target)
+        with self._lock:
+            bars = self._bars.get(key)
+        seconds = df.index.as_unit("s").asi8
+        if bars is not None and seconds[0] <= bars[0][-1]:
+            first = int(np.searchsorted(seconds, bars[0][-1]))
+            new = _aggregate(*(column[first:] for column in frame_arrays(df)), period)
+            keep = int(np.searchsorted(bars[0], new[0][0]))
+            bars = tuple(np.concatenate([old[:keep], fresh]) for old, fresh in zip(bars, new))
+        else:
+            bars = _aggregate(*frame_arrays(self._history(pair, base, target, df)), period)
+        bars = tuple(column[-self.max_bars:] for column in bars)
+        with self._lock:
+            self._bars[key] = bars
+        return _frame(bars, _last_complete(bars[0], period, df.attrs.get("last_complete"), base))
+
+    def _history(self, pair, base, target, df):
+        archive = self.store.archive if self.store is not None else None
+        if archive is None:
+            return df
+        bars = self.max_bars * GRANULARITY_SECONDS[target] // GRANULARITY_SECONDS[base]
+        older = archive.read(pair, base, end=df.index[0] - pd.Timedelta(seconds=1), bars=bars)
+        if older.empty:
+            return df
+        return pd.concat([older, df[["open", "high", "low", "close"]]])
+
+    def clear(self):
+        with self._lock:
+            self._bars.clear()
+
+def trend_bias(latest):
+    # Trend on one timeframe: price against SMA50 and the MACD histogram have to point the same way.
+    if any(pd.isna(latest.get(column)) for column in ("close", "sma50", "macd_hist")):
+        return "Unknown"
+    if latest["close"] > latest["sma50"] and latest["macd_hist"] > 0:
+        return "Bullish"
+    if latest["close"] < latest["sma50"] and latest["macd_hist"] < 0:
+        return "Bearish"
+    return "Neutral"
+
+def confirm_timeframes(result, biases, require=REQUIRE_AGREEMENT):
+    # With agreement required, a BUY/SELL stands only if every higher timeframe with enough history
+    # trends the same way; timeframes still reporting "Unknown" do not block it.
+    signal, strength, sl, tp, analysis, recommendation, confidence = result
+    if not require or signal == "HOLD":
+        return result
+    wanted = "Bullish" if signal == "BUY" else "Bearish"
+    against = [tf for tf, bias in biases.items() if bias not in (wanted, "Unknown")]
+    if not against:
+        return result
+    analysis += f" {signal} held: {', '.join(against)} trend disagrees."
+    return "HOLD", strength, sl, tp, analysis, "Wait for higher timeframes to agree.", 0.5